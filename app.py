@@ -5,6 +5,8 @@ All routes and models are defined in separate modules.
 """
 
 import os
+import json
+import click
 from config import app, db
 
 # Import models first to ensure tables are defined
@@ -23,14 +25,19 @@ import routes.history
 import routes.seo
 import routes.content
 
-# Tạo tables ngay sau khi import models (cho Gunicorn)
-# Chỉ chạy khi không phải local dev server
-with app.app_context():
-    try:
-        db.create_all()
-        print(">>> Tables created successfully")
-    except Exception as e:
-        print(f">>> Error creating tables: {e}")
+# Khởi động sẵn rank index (dựng trong thread nền) và process pool của hint
+# engine để request đầu tiên không phải chờ (bỏ qua với các lệnh `flask ...`)
+if not os.getenv("FLASK_RUN_FROM_CLI"):
+    from rank_index import get_rank_index
+
+    with app.app_context():
+        get_rank_index(app.config)
+    if app.config["HINT_POOL_SIZE"] > 1:
+        from hint_solver import get_pool
+        get_pool(app.config["HINT_POOL_SIZE"])
+
+# Migration KHÔNG chạy khi import (mỗi worker Gunicorn sẽ chạy song song):
+# chạy một lần trước khi khởi động server bằng `flask db-migrate` (xem Procfile)
 
 
 @app.cli.command("init-db")
@@ -40,9 +47,103 @@ def init_db():
     print("DB ready.")
 
 
+@app.cli.command("db-migrate")
+def db_migrate():
+    """Chạy các migration schema còn thiếu (không xoá dữ liệu)."""
+    from schema_migrations import current_version, run_migrations
+
+    applied = run_migrations(db.engine)
+    print(f"Schema version {current_version(db.engine)} ({len(applied)} migration mới).")
+
+
+@app.cli.command("db-check-indexes")
+def db_check_indexes():
+    """Báo các index còn thiếu cho những truy vấn nóng trong routes/."""
+    from schema_migrations import missing_indexes
+
+    missing = missing_indexes(db.engine)
+    for name, table, columns, usage in missing:
+        print(f"THIẾU {name}: {table}({', '.join(columns)}) - {usage}")
+    if missing:
+        raise SystemExit(1)
+    print("Đủ index.")
+
+
+@app.cli.command("simulate")
+@click.option("--games", default=1000, show_default=True, help="Số ván cần chơi.")
+@click.option("--policy", type=click.Choice(["random", "greedy", "hint"]), default="random", show_default=True)
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True, help="Số process.")
+@click.option("--seed", default=0, show_default=True, help="Seed của ván đầu tiên.")
+@click.option("--output", default=None, help="File kết quả từng ván (.ndjson hoặc .csv).")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default=None)
+@click.option("--hint-depth", default=2, show_default=True)
+@click.option("--hint-node-budget", default=5000, show_default=True)
+def simulate(games, policy, workers, seed, output, fmt, hint_depth, hint_node_budget):
+    """Chơi tự động nhiều ván (headless) và in thống kê hiệu năng."""
+    from simulator import run_simulation
+
+    summary = run_simulation(
+        games, policy=policy, workers=workers, seed=seed, output=output, fmt=fmt,
+        hint_depth=hint_depth, hint_node_budget=hint_node_budget
+    )
+    print(json.dumps(summary, indent=2))
+
+
+@app.cli.command("backfill-user-best")
+def backfill_user_best_command():
+    """Dựng lại bảng user_best (leaderboard) từ toàn bộ scores."""
+    from scoring import backfill_user_best
+
+    print(f"Đã ghi điểm cao nhất của {backfill_user_best()} user.")
+
+
+@app.cli.command("recompute-user-stats")
+def recompute_user_stats_command():
+    """Tính lại bảng user_stats (trang lịch sử) từ toàn bộ scores."""
+    from scoring import recompute_user_stats
+
+    print(f"Đã tính lại thống kê của {recompute_user_stats()} user.")
+
+
+@app.cli.command("compact-leaderboards")
+@click.option("--keep-days", default=7, show_default=True, help="Số ngày giữ bucket theo ngày.")
+@click.option("--keep-weeks", default=8, show_default=True, help="Số tuần giữ bucket theo tuần.")
+def compact_leaderboards(keep_days, keep_weeks):
+    """Xoá bucket leaderboard ngày/tuần cũ (chạy định kỳ, vd. cron mỗi ngày)."""
+    from scoring import compact_periods
+
+    print(f"Đã xoá {compact_periods(keep_days, keep_weeks)} dòng bucket cũ.")
+
+
+@app.cli.command("expire-premium")
+def expire_premium():
+    """Tắt Premium của các gói đã hết hạn bằng một UPDATE (chạy định kỳ, vd. cron mỗi giờ)."""
+    from entitlements import expire_lapsed
+
+    print(f"Đã tắt Premium hết hạn của {expire_lapsed()} user.")
+
+
+@app.cli.command("purge-game-states")
+def purge_game_states():
+    """Xoá trạng thái game hết hạn (game_states), seed của các ván bỏ dở và dấu xoá checkpoint cũ."""
+    from checkpoint import get_checkpoints
+    from game_store import get_overflow_store, get_store, SQLGameStore
+    from scoring import purge_issued_games
+
+    print(f"Đã xoá {purge_issued_games(app.config['GAME_STORE_TTL'])} seed ván bỏ dở.")
+    print(f"Đã xoá {get_checkpoints(app.config).purge_tombstones(app.config['GAME_STORE_TTL'])} dấu xoá checkpoint.")
+    # Backend cookie: bảng game_states chứa các game quá lớn cho cookie
+    store = get_store(app.config) or get_overflow_store(app.config)
+    if not isinstance(store, SQLGameStore):
+        print("GAME_STORE không phải sql - không có gì để xoá.")
+        return
+    print(f"Đã xoá {store.purge_expired()} game hết hạn.")
+
+
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        from schema_migrations import run_migrations
+        run_migrations(db.engine)
     # Lấy PORT từ environment variable (Railway sẽ set)
     port = int(os.getenv("PORT", 5000))
     # Debug mode chỉ bật khi không phải production
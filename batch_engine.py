@@ -0,0 +1,124 @@
+"""
+Batch engine (NumPy) - mô phỏng hàng nghìn bàn cờ cùng lúc.
+
+Bàn cờ là mảng (N, 4, 4) chứa giá trị ô (0, 2, 4, ...). Mọi phép toán được
+vector hoá trên cả N bàn cờ và cho kết quả giống hệt Game2048.move().
+"""
+
+import numpy as np
+
+SIZE = 4
+DIRECTIONS = ("left", "right", "up", "down")
+DIRECTION_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+
+
+def _to_left(boards, direction):
+    """Xoay bàn cờ sao cho hướng đi trở thành hướng trái."""
+    if direction == "right":
+        return boards[:, :, ::-1]
+    if direction == "up":
+        return boards.transpose(0, 2, 1)
+    if direction == "down":
+        return boards.transpose(0, 2, 1)[:, :, ::-1]
+    return boards
+
+
+def _from_left(boards, direction):
+    """Phép biến đổi ngược của _to_left()."""
+    if direction == "right":
+        return boards[:, :, ::-1]
+    if direction == "up":
+        return boards.transpose(0, 2, 1)
+    if direction == "down":
+        return boards[:, :, ::-1].transpose(0, 2, 1)
+    return boards
+
+
+def _compress(rows):
+    """Nén các hàng (M, 4): đẩy ô khác 0 về trái, giữ thứ tự."""
+    order = np.argsort(rows == 0, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1)
+
+
+def _slide_left(rows):
+    """Nén -> gộp -> nén các hàng (M, 4) như Game2048.operate(). Trả về (hàng mới, điểm)."""
+    rows = _compress(rows)
+    score = np.zeros(rows.shape[0], dtype=np.int64)
+    for i in range(SIZE - 1):
+        merge = (rows[:, i] != 0) & (rows[:, i] == rows[:, i + 1])
+        rows[merge, i] *= 2
+        rows[merge, i + 1] = 0
+        score += np.where(merge, rows[:, i], 0)
+    return _compress(rows), score
+
+
+def _move_one_direction(boards, direction):
+    """Di chuyển tất cả bàn cờ theo cùng một hướng. Trả về (bàn cờ mới, điểm cộng)."""
+    n = boards.shape[0]
+    rows = np.ascontiguousarray(_to_left(boards, direction)).reshape(n * SIZE, SIZE)
+    rows, row_scores = _slide_left(rows)
+    moved = _from_left(rows.reshape(n, SIZE, SIZE), direction)
+    return np.ascontiguousarray(moved), row_scores.reshape(n, SIZE).sum(axis=1)
+
+
+def batch_game_over(boards):
+    """Mặt nạ (N,) các bàn cờ không còn nước đi (không ô trống, không cặp kề nhau bằng nhau)."""
+    boards = np.asarray(boards)
+    has_empty = (boards == 0).any(axis=(1, 2))
+    horizontal = (boards[:, :, :-1] == boards[:, :, 1:]).any(axis=(1, 2))
+    vertical = (boards[:, :-1, :] == boards[:, 1:, :]).any(axis=(1, 2))
+    return ~(has_empty | horizontal | vertical)
+
+
+def batch_spawn(boards, rng=None, mask=None):
+    """
+    Thêm ô mới (90% là 2, 10% là 4) vào một ô trống ngẫu nhiên của mỗi bàn cờ.
+    mask (N,) chọn bàn cờ được thêm ô; bàn cờ đầy bị bỏ qua.
+    Trả về (bàn cờ mới, vị trí ô mới (N,) theo r * 4 + c, -1 nếu không thêm).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    boards = np.array(boards, dtype=np.int64, copy=True)
+    n = boards.shape[0]
+    flat = boards.reshape(n, SIZE * SIZE)
+
+    empty = flat == 0
+    keys = np.where(empty, rng.random((n, SIZE * SIZE)), -1.0)
+    cells = keys.argmax(axis=1)
+    values = np.where(rng.random(n) < 0.9, 2, 4)
+
+    active = empty.any(axis=1)
+    if mask is not None:
+        active &= np.asarray(mask, dtype=bool)
+    rows = np.nonzero(active)[0]
+    flat[rows, cells[rows]] = values[rows]
+    return boards, np.where(active, cells, -1)
+
+
+def batch_move(boards, directions, spawn=False, rng=None):
+    """
+    Thực hiện nước đi cho N bàn cờ.
+    directions: một hướng (str) cho tất cả, hoặc N hướng (str hoặc chỉ số 0-3 theo DIRECTIONS).
+    spawn=True thêm ô mới vào các bàn cờ đã thay đổi (như Game2048.move()) trước khi
+    kiểm tra game over.
+    Trả về (bàn cờ mới, điểm cộng (N,), changed (N,), game_over (N,)).
+    """
+    boards = np.asarray(boards, dtype=np.int64)
+    n = boards.shape[0]
+
+    if isinstance(directions, str):
+        new_boards, scores = _move_one_direction(boards, directions)
+    else:
+        directions = np.asarray(directions)
+        if directions.dtype.kind in "US":
+            directions = np.vectorize(DIRECTION_INDEX.__getitem__, otypes=[np.int64])(directions)
+        new_boards = np.empty_like(boards)
+        scores = np.zeros(n, dtype=np.int64)
+        for index, direction in enumerate(DIRECTIONS):
+            selected = directions == index
+            if selected.any():
+                new_boards[selected], scores[selected] = _move_one_direction(boards[selected], direction)
+
+    changed = (new_boards != boards).any(axis=(1, 2))
+    if spawn:
+        new_boards, _ = batch_spawn(new_boards, rng, mask=changed)
+    return new_boards, scores, changed, batch_game_over(new_boards)
@@ -0,0 +1,363 @@
+"""
+Micro-benchmark cho game engine và đường đi session.
+
+Đo Game2048 / BitboardGame2048 (setup, move, any_moves_left, shuffle,
+get_hint) và vòng load_game/save_game qua Flask test client với seed cố
+định, có warmup, báo cáo ops/sec, p50, p99. Kết quả ghi ra file JSON và có
+thể so sánh với một lần chạy trước để phát hiện regression:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --compare bench.json --threshold 0.1
+
+Mục tiêu tốc độ của bitboard so với Game2048 (SPEEDUP_TARGETS) được kiểm tra
+bằng --check-targets. Nước đi trên bảng tra (bitboard.execute_move) nhanh hơn
+Game2048.move ít nhất 10 lần; cả move() chỉ nhanh hơn ít nhất 4 lần vì ô mới
+sinh bằng RNG có khoá (blake2b + splitmix64, ~2,5us mỗi nước) để replay xác
+minh được điểm - Game2048 dùng random của stdlib nên không so sánh ngang được:
+
+    python benchmark.py --only move --no-session --check-targets
+
+Kiểm tra gợi ý song song (HINT_POOL_SIZE) tìm sâu ít nhất bằng tuần tự:
+
+    python benchmark.py --hint-depth-check 4
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+
+from bitboard import DIRECTIONS, BitboardGame2048, execute_move
+from game_logic import Game2048
+
+# Số nước đi ngẫu nhiên để tạo các vị trí giữa ván
+POSITION_MOVES = (10, 40, 80, 150)
+
+SESSION_CASES = ("session.load_game", "session.move", "session.moves_x8")
+
+# (benchmark, benchmark gốc): số lần nhanh hơn tối thiểu theo ops/sec
+SPEEDUP_TARGETS = {
+    ("bitboard.execute_move", "game2048.move"): 10.0,
+    ("bitboard.move", "game2048.move"): 4.0,
+}
+
+
+def _positions(seed, count):
+    """Tạo `count` vị trí giữa ván (grid, score, moves) từ seed cố định."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        g = Game2048()
+        random.seed(rng.random())
+        g.setup()
+        target = rng.choice(POSITION_MOVES)
+        while g.moves < target and g.any_moves_left():
+            g.move(rng.choice(DIRECTIONS))
+        if g.any_moves_left():
+            positions.append(([row[:] for row in g.grid], g.score, g.moves))
+    return positions
+
+
+def _game_at(cls, position):
+    """Tạo game mới của lớp `cls` tại vị trí cho trước."""
+    grid, score, moves = position
+    g = cls()
+    g.grid = [row[:] for row in grid]
+    g.score = score
+    g.moves = moves
+    return g
+
+
+def _after_move(prepare):
+    """Bọc prepare(i): đi một nước có thay đổi (như sau /api/move) trước khi đo."""
+    def prepare_moved(i):
+        g = prepare(i)
+        for direction in DIRECTIONS:
+            if g.move(direction).get("changed"):
+                break
+        return g
+    return prepare_moved
+
+
+def _timed(prepare, op, iterations, warmup):
+    """
+    Chạy op(state) với state = prepare(i) (không tính giờ phần prepare).
+    Trả về danh sách thời gian từng lần (ns), bỏ qua các lần warmup.
+    """
+    samples = []
+    for i in range(warmup + iterations):
+        state = prepare(i)
+        started = time.perf_counter_ns()
+        op(state)
+        elapsed = time.perf_counter_ns() - started
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+def _summary(samples):
+    """ops/sec, p50, p99 (micro giây) từ danh sách thời gian (ns)."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] / 1000, 2)
+
+    return {
+        "iterations": len(ordered),
+        "ops_per_sec": round(len(ordered) * 1e9 / total, 1) if total else 0.0,
+        "p50_us": percentile(0.50),
+        "p99_us": percentile(0.99),
+    }
+
+
+def engine_cases(seed, hint_depth):
+    """Các benchmark engine: {tên: (prepare, op)}."""
+    positions = _positions(seed, 64)
+    cases = {}
+
+    for name, cls in (("game2048", Game2048), ("bitboard", BitboardGame2048)):
+        def prepare_game(i, cls=cls):
+            random.seed(seed + i)
+            return _game_at(cls, positions[i % len(positions)])
+
+        def prepare_move(i, cls=cls):
+            return prepare_game(i, cls), DIRECTIONS[i % 4]
+
+        def prepare_new(i, cls=cls):
+            random.seed(seed + i)
+            return cls()
+
+        def setup(g, cls=cls):
+            # BitboardGame2048 nhận seed để spawn tất định
+            g.setup(seed) if cls is BitboardGame2048 else g.setup()
+
+        cases[f"{name}.setup"] = (prepare_new, setup)
+        cases[f"{name}.move"] = (prepare_move, lambda state: state[0].move(state[1]))
+        if cls is BitboardGame2048:
+            # Chỉ nước đi trên bảng tra (không sinh ô mới, không cập nhật game)
+            cases[f"{name}.execute_move"] = (
+                lambda i: (prepare_game(i).board, DIRECTIONS[i % 4]), lambda state: execute_move(*state)
+            )
+            # Sau move() thống kê đã được tính sẵn (như trong /api/move); ".cold" phải tính lại
+            cases[f"{name}.any_moves_left"] = (_after_move(prepare_game), lambda g: g.any_moves_left())
+            cases[f"{name}.any_moves_left.cold"] = (prepare_game, lambda g: g.any_moves_left())
+        else:
+            cases[f"{name}.any_moves_left"] = (prepare_game, lambda g: g.any_moves_left())
+        cases[f"{name}.shuffle"] = (prepare_game, lambda g: g.shuffle())
+
+    cases["game2048.get_hint"] = (
+        lambda i: _game_at(Game2048, positions[i % len(positions)]),
+        lambda g: g.get_hint()
+    )
+    cases["bitboard.get_hint"] = (
+        lambda i: _game_at(BitboardGame2048, positions[i % len(positions)]),
+        lambda g: g.get_hint(depth=hint_depth, node_budget=20000, table=None, deadline_ms=0)
+    )
+    return cases
+
+
+def session_cases(seed):
+    """
+    Các benchmark qua Flask test client (SQLite tạm):
+    GET /api/load_game (load_game) và POST /api/move (load_game + move + save_game).
+    """
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    import app as _app  # noqa: F401 - đăng ký routes
+    from checkpoint import get_checkpoints
+    from config import app, db
+    from schema_migrations import run_migrations
+
+    with app.app_context():
+        run_migrations(db.engine, log=None)
+        # Dừng thread ghi checkpoint để nó không chạy song song với phép đo;
+        # save_game vẫn ghi vào bộ đệm nên chi phí trong request vẫn được đo
+        get_checkpoints(app.config).close()
+
+    app.config["TESTING"] = True
+    # Ghi điểm ngay trong request: không để thread write-behind chạy song song với phép đo
+    # và không ghi file spool khi thoát
+    app.config["SCORE_INGEST"] = "sync"
+    client = app.test_client()
+    client.post("/register", data={"username": "bench", "password": "bench"})
+    client.post("/login", data={"username": "bench", "password": "bench"})
+    client.post("/api/start_game")
+
+    def check(response):
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.request.path}: HTTP {response.status_code}")
+        return response
+
+    def move(direction):
+        data = check(client.post("/api/move", json={"direction": direction})).get_json()
+        if data.get("game_over"):
+            client.post("/api/start_game")
+
+    def moves(directions):
+        data = check(client.post("/api/moves", json={"directions": directions})).get_json()
+        if data.get("game_over"):
+            client.post("/api/start_game")
+
+    rng = random.Random(seed)
+    return dict(zip(SESSION_CASES, (
+        (lambda i: None, lambda _: check(client.get("/api/load_game"))),
+        (lambda i: rng.choice(DIRECTIONS), move),
+        (lambda i: [rng.choice(DIRECTIONS) for _ in range(8)], moves),
+    )))
+
+
+def run(iterations=2000, warmup=200, seed=2048, hint_depth=3, only=None, session=True, log=sys.stderr):
+    """Chạy các benchmark (lọc theo chuỗi con `only`). Trả về dict kết quả."""
+    cases = engine_cases(seed, hint_depth)
+    if session and (not only or any(only in name for name in SESSION_CASES)):
+        # config.py/app.py in log khi import - không trộn vào kết quả
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull), redirect_stderr(devnull):
+            cases.update(session_cases(seed))
+
+    results = {}
+    for name, (prepare, op) in cases.items():
+        if only and only not in name:
+            continue
+        # get_hint chậm hơn nhiều bậc - giảm số lần lặp
+        count, warm = (max(1, iterations // 20), max(1, warmup // 20)) if "get_hint" in name else (iterations, warmup)
+        results[name] = _summary(_timed(prepare, op, count, warm))
+        if log:
+            r = results[name]
+            print(f"{name:28s} {r['ops_per_sec']:>12,.1f} ops/s  p50 {r['p50_us']:>10.2f}us  "
+                  f"p99 {r['p99_us']:>10.2f}us", file=log)
+    return {"meta": _meta(iterations, warmup, seed), "results": results}
+
+
+def hint_depth_check(pool_size, seed=2048, count=20, depth=6, node_budget=50000, deadline_ms=250, log=sys.stderr):
+    """
+    So sánh độ sâu đạt được của gợi ý tuần tự và song song (pool_size process)
+    trên cùng các vị trí và deadline. Trả về danh sách (vị trí, độ sâu tuần tự,
+    độ sâu song song) của các vị trí mà song song nông hơn.
+    """
+    from hint_solver import ExpectimaxSolver, get_pool, parallel_search, pool_ready
+
+    get_pool(pool_size)
+    while not pool_ready():
+        time.sleep(0.05)
+    shallower = []
+    totals = [0, 0]
+    for i, position in enumerate(_positions(seed, count)):
+        board = _game_at(BitboardGame2048, position).board
+        sequential = ExpectimaxSolver(depth, node_budget).iterative_search(board, deadline_ms / 1000.0)
+        parallel = parallel_search(board, depth, node_budget, deadline_ms / 1000.0, pool_size)
+        totals[0] += sequential["depth"]
+        totals[1] += parallel["depth"]
+        if parallel["depth"] < sequential["depth"]:
+            shallower.append((i, sequential["depth"], parallel["depth"]))
+    if log:
+        print(f"độ sâu trung bình: tuần tự {totals[0] / count:.2f}, song song {totals[1] / count:.2f} "
+              f"({pool_size} process, {deadline_ms}ms)", file=log)
+    return shallower
+
+
+def _meta(iterations, warmup, seed):
+    """Thông tin môi trường chạy benchmark."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "iterations": iterations,
+        "warmup": warmup,
+        "seed": seed,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    So sánh hai lần chạy. Regression: ops/sec giảm hoặc p99 tăng quá `threshold`.
+    Trả về danh sách (tên, chỉ số, giá trị cũ, giá trị mới).
+    """
+    regressions = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        if new["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+            regressions.append((name, "ops_per_sec", old["ops_per_sec"], new["ops_per_sec"]))
+        if new["p99_us"] > old["p99_us"] * (1 + threshold):
+            regressions.append((name, "p99_us", old["p99_us"], new["p99_us"]))
+    return regressions
+
+
+def check_targets(current, targets=SPEEDUP_TARGETS):
+    """
+    So sánh ops/sec với SPEEDUP_TARGETS. Trả về danh sách (benchmark, gốc,
+    số lần đạt được, mục tiêu) của các cặp không đạt (bỏ qua cặp chưa chạy).
+    """
+    results = current["results"]
+    missed = []
+    for (name, base), target in targets.items():
+        if name not in results or base not in results:
+            continue
+        speedup = results[name]["ops_per_sec"] / results[base]["ops_per_sec"]
+        print(f"{name} / {base}: {speedup:.1f}x (mục tiêu {target:.0f}x)", file=sys.stderr)
+        if speedup < target:
+            missed.append((name, base, speedup, target))
+    return missed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark game engine và session.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=2048)
+    parser.add_argument("--hint-depth", type=int, default=3)
+    parser.add_argument("--only", default=None, help="Chỉ chạy benchmark có tên chứa chuỗi này.")
+    parser.add_argument("--no-session", action="store_true", help="Bỏ qua benchmark Flask/session.")
+    parser.add_argument("--output", default=None, help="Ghi kết quả ra file JSON.")
+    parser.add_argument("--compare", default=None, help="File JSON của lần chạy trước để so sánh.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Ngưỡng regression (0.1 = 10%%).")
+    parser.add_argument("--check-targets", action="store_true", help="Kiểm tra SPEEDUP_TARGETS.")
+    parser.add_argument("--hint-depth-check", type=int, default=None, metavar="POOL_SIZE",
+                        help="Chỉ kiểm tra gợi ý song song tìm sâu ít nhất bằng tuần tự.")
+    args = parser.parse_args(argv)
+
+    if args.hint_depth_check:
+        if (os.cpu_count() or 1) < args.hint_depth_check:
+            print(f"Cần ít nhất {args.hint_depth_check} CPU (máy có {os.cpu_count()}) - bỏ qua.", file=sys.stderr)
+            return 0
+        shallower = hint_depth_check(args.hint_depth_check, args.seed)
+        for i, sequential, parallel in shallower:
+            print(f"NÔNG HƠN vị trí {i}: tuần tự {sequential}, song song {parallel}", file=sys.stderr)
+        return 1 if shallower else 0
+
+    current = run(args.iterations, args.warmup, args.seed, args.hint_depth, args.only, not args.no_session)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.check_targets and check_targets(current):
+        return 1
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old} -> {new}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("Không có regression.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,784 @@
+"""
+Bitboard engine cho 2048.
+
+Bàn cờ 4x4 được nén vào một số nguyên 64-bit: mỗi ô chiếm 4 bit lưu số mũ
+của giá trị (0 = ô trống, 1 = 2, 2 = 4, ..., 15 = 32768). Ô (r, c) nằm ở
+bit 4 * (4 * r + c), nên mỗi hàng là một khoá 16-bit và mỗi nước đi chỉ
+là 4 lần tra bảng 65.536 phần tử.
+
+Các bảng tra theo hàng là mảng số (khoảng 2,6 MB) được sinh một lần, ghi ra
+file (ghi tạm rồi os.replace) và nạp bằng mmap như heuristics.py - các worker
+gunicorn và process con của hint engine dùng chung một bản trong page cache
+thay vì mỗi process tự sinh lại.
+"""
+
+import array
+import hashlib
+import mmap
+import os
+import random
+import secrets
+import struct
+import sys
+import tempfile
+import threading
+from collections import deque
+from game_logic import Game2048
+
+SIZE = 4
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15
+DIRECTIONS = ("left", "right", "up", "down")
+
+# Bảng tra: giá trị ô -> số mũ
+EXPONENT_OF = {0: 0}
+for _e in range(1, MAX_EXPONENT + 1):
+    EXPONENT_OF[1 << _e] = _e
+
+TABLE_VERSION = 1
+ROWS = 1 << 16
+# (tên, typecode) của từng bảng trong file, theo thứ tự
+TABLE_LAYOUT = (
+    ("up", "q"), ("down", "q"),
+    ("left", "i"), ("right", "i"), ("score_left", "I"), ("score_right", "I"),
+    ("merge_left", "B"), ("merge_right", "B"),
+    ("empty_mask", "B"), ("empty_count", "B"), ("row_max", "B"), ("row_merge", "B"),
+)
+
+# magic, phiên bản, số bảng
+_TABLE_HEADER = struct.Struct("<8sII")
+_TABLE_MAGIC = b"B2048ROW"
+
+# Mặt nạ 4 bit (bit c = ô c) -> các ô theo thứ tự tăng / giảm
+MASK_CELLS = tuple(tuple(c for c in range(SIZE) if mask >> c & 1) for mask in range(16))
+MASK_CELLS_REVERSED = tuple(cells[::-1] for cells in MASK_CELLS)
+# Byte (2 ô) -> giá trị của 2 ô
+PAIR_VALUES = tuple(
+    tuple((1 << e) if e else 0 for e in (byte & 0xF, byte >> 4)) for byte in range(256)
+)
+
+_tables = None
+_tables_lock = threading.Lock()
+# blake2b đã nạp khoá trộn seed - mỗi lần sinh RNG chỉ copy() thay vì nạp lại khoá
+_seed_hasher = hashlib.blake2b(digest_size=8)
+_NONCE = struct.Struct("<QQ")
+
+MASK64 = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+# 53 bit cao -> số thực trong [0, 1)
+UNIT = 1.0 / 9007199254740992
+
+# Ký hiệu trong move log: 1 ký tự cho mỗi nước đi / shuffle,
+# "W" + 2 chữ thường (ô a..p) cho swap
+MOVE_TOKENS = {"left": "L", "right": "R", "up": "U", "down": "D"}
+TOKEN_MOVES = {token: direction for direction, token in MOVE_TOKENS.items()}
+SHUFFLE_TOKEN = "S"
+SWAP_TOKEN = "W"
+
+
+def _reverse_row(row):
+    """Đảo thứ tự 4 ô trong khoá hàng 16-bit."""
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+
+
+def _row_to_column(row):
+    """Đặt 4 ô của khoá hàng 16-bit thành một cột (ô thứ c ở bit 16 * c)."""
+    return (row & 0xF) | ((row & 0xF0) << 12) | ((row & 0xF00) << 24) | ((row & 0xF000) << 36)
+
+
+def _slide_row_left(exps):
+    """
+    Trượt một hàng (danh sách số mũ) sang trái.
+    Giữ đúng thứ tự nén -> gộp -> nén của Game2048.operate().
+    """
+    arr = [e for e in exps if e]
+    arr += [0] * (SIZE - len(arr))
+    score = 0
+    merged = []
+    for i in range(SIZE - 1):
+        if arr[i] and arr[i] == arr[i + 1]:
+            arr[i] += 1
+            score += 1 << arr[i]
+            arr[i + 1] = 0
+            merged.append(i)
+    arr = [e for e in arr if e]
+    arr += [0] * (SIZE - len(arr))
+    return arr, score, tuple(merged)
+
+
+def build_tables():
+    """
+    Sinh các bảng tra 65.536 phần tử (tất định). Trả về dict {tên: array} theo TABLE_LAYOUT.
+    Bảng up/down nhận cột (hàng của bàn cờ đã chuyển vị) và trả về cột đã đặt lại
+    đúng vị trí nên execute_move() chỉ cần chuyển vị một lần. Hàng mà nước đi
+    gộp hai ô 32768 (tràn 4 bit) có giá trị -1 để execute_move() báo lỗi.
+    merge_* là mặt nạ các ô được gộp, empty_mask là mặt nạ các ô trống.
+    """
+    tables = {name: array.array(typecode, bytes(array.array(typecode).itemsize * ROWS))
+              for name, typecode in TABLE_LAYOUT}
+    left = tables["left"]
+    right = tables["right"]
+
+    for row in range(ROWS):
+        exps = [(row >> (4 * c)) & 0xF for c in range(SIZE)]
+        tables["empty_mask"][row] = sum(1 << c for c, e in enumerate(exps) if not e)
+        tables["empty_count"][row] = exps.count(0)
+        tables["row_max"][row] = max(exps)
+        tables["row_merge"][row] = any(exps[c] and exps[c] == exps[c + 1] for c in range(SIZE - 1))
+        result, score, merged = _slide_row_left(exps)
+        if max(result) > MAX_EXPONENT:
+            left[row] = -1
+            continue
+        packed = 0
+        for c, e in enumerate(result):
+            packed |= e << (4 * c)
+        left[row] = packed
+        tables["score_left"][row] = score
+        tables["merge_left"][row] = sum(1 << c for c in merged)
+
+    for row in range(ROWS):
+        rev = _reverse_row(row)
+        right[row] = _reverse_row(left[rev]) if left[rev] >= 0 else -1
+        tables["score_right"][row] = tables["score_left"][rev]
+        tables["merge_right"][row] = sum(1 << (SIZE - 1 - c) for c in MASK_CELLS[tables["merge_left"][rev]])
+        tables["up"][row] = _row_to_column(left[row]) if left[row] >= 0 else -1
+    for row in range(ROWS):
+        tables["down"][row] = _row_to_column(right[row]) if right[row] >= 0 else -1
+    return tables
+
+
+def default_tables_path():
+    """Đường dẫn file bảng: BITBOARD_TABLES_PATH hoặc thư mục tạm của hệ thống."""
+    return os.getenv("BITBOARD_TABLES_PATH") or os.path.join(
+        tempfile.gettempdir(), f"game2048-bitboard-v{TABLE_VERSION}.bin"
+    )
+
+
+def write_tables(path, tables=None):
+    """Ghi bảng ra file (ghi file tạm cùng thư mục rồi os.replace)."""
+    tables = tables or build_tables()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bitboard-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_TABLE_HEADER.pack(_TABLE_MAGIC, TABLE_VERSION, len(TABLE_LAYOUT)))
+            for name, _ in TABLE_LAYOUT:
+                f.write(tables[name].tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _map_tables(path):
+    """mmap file bảng. Trả về dict {tên: memoryview} hoặc None nếu file không hợp lệ."""
+    sizes = [array.array(typecode).itemsize * ROWS for _, typecode in TABLE_LAYOUT]
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size != _TABLE_HEADER.size + sum(sizes):
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if _TABLE_HEADER.unpack_from(mapped, 0) != (_TABLE_MAGIC, TABLE_VERSION, len(TABLE_LAYOUT)):
+        mapped.close()
+        return None
+    if sys.byteorder != "little":
+        mapped.close()
+        return None
+
+    view = memoryview(mapped)
+    tables = {}
+    offset = _TABLE_HEADER.size
+    for (name, typecode), size in zip(TABLE_LAYOUT, sizes):
+        tables[name] = view[offset:offset + size].cast(typecode)
+        offset += size
+    return tables
+
+
+def _load_tables(path):
+    """Nạp bảng từ file (sinh và ghi file nếu chưa có / không hợp lệ; không ghi được thì giữ trong bộ nhớ)."""
+    tables = _map_tables(path)
+    if tables is None:
+        built = build_tables()
+        try:
+            write_tables(path, built)
+            tables = _map_tables(path)
+        except OSError:
+            tables = None
+        tables = tables or built
+    return {
+        **tables,
+        # (bàn cờ sau nước đi, điểm, mặt nạ ô gộp, mặt nạ -> ô theo thứ tự trong merged_cells)
+        "left": (tables["left"], tables["score_left"], tables["merge_left"], MASK_CELLS),
+        "right": (tables["right"], tables["score_right"], tables["merge_right"], MASK_CELLS_REVERSED),
+        "up": (tables["up"], tables["score_left"], tables["merge_left"], MASK_CELLS),
+        "down": (tables["down"], tables["score_right"], tables["merge_right"], MASK_CELLS_REVERSED),
+    }
+
+
+class TileRng:
+    """
+    RNG splitmix64 nhỏ gọn, có choice()/random()/shuffle() như random.Random.
+    Mỗi lần thêm ô dùng một TileRng riêng nên không cần lưu trạng thái RNG.
+    """
+
+    __slots__ = ("state",)
+
+    def __init__(self, state):
+        self.state = state & MASK64
+
+    def next64(self):
+        """Số ngẫu nhiên 64-bit tiếp theo."""
+        self.state = (self.state + GOLDEN) & MASK64
+        z = self.state
+        z = ((z ^ (z >> 30)) * MIX1) & MASK64
+        z = ((z ^ (z >> 27)) * MIX2) & MASK64
+        return z ^ (z >> 31)
+
+    def random(self):
+        """Số thực trong [0, 1) (next64() viết gọn tại chỗ)."""
+        state = self.state = (self.state + GOLDEN) & MASK64
+        z = ((state ^ (state >> 30)) * MIX1) & MASK64
+        z = ((z ^ (z >> 27)) * MIX2) & MASK64
+        return ((z ^ (z >> 31)) >> 11) * UNIT
+
+    def randrange(self, n):
+        """Số nguyên ngẫu nhiên trong [0, n) - cùng chỉ số với choice() trên dãy dài n."""
+        return int(self.random() * n)
+
+    def choice(self, seq):
+        """Chọn ngẫu nhiên một phần tử."""
+        return seq[int(self.random() * len(seq))]
+
+    def shuffle(self, seq):
+        """Xáo trộn tại chỗ (Fisher-Yates)."""
+        for i in range(len(seq) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            seq[i], seq[j] = seq[j], seq[i]
+
+
+def set_seed_key(secret):
+    """
+    Đặt khoá bí mật trộn vào seed. Seed nằm trong session (client đọc được),
+    khoá này khiến client không đoán trước được ô mới.
+    """
+    global _seed_hasher
+    if isinstance(secret, str):
+        secret = secret.encode()
+    _seed_hasher = hashlib.blake2b(key=hashlib.blake2b(secret).digest(), digest_size=8)
+
+
+def tile_rng(seed, nonce):
+    """RNG tất định cho lần ngẫu nhiên thứ `nonce` của ván có `seed`."""
+    hasher = _seed_hasher.copy()
+    hasher.update(_NONCE.pack(seed, nonce))
+    return TileRng(int.from_bytes(hasher.digest(), "little"))
+
+
+def new_seed():
+    """Seed ngẫu nhiên cho ván mới."""
+    return secrets.randbits(63)
+
+
+def log_tokens(log):
+    """Tách move log thành danh sách (vị trí, ký hiệu)."""
+    tokens = []
+    i = 0
+    while i < len(log):
+        width = 3 if log[i] == SWAP_TOKEN else 1
+        tokens.append((i, log[i:i + width]))
+        i += width
+    return tokens
+
+
+def get_tables():
+    """Trả về bảng tra (mmap từ file dùng chung, nạp một lần cho mỗi process)."""
+    global _tables
+    if _tables is None:
+        with _tables_lock:
+            if _tables is None:
+                _tables = _load_tables(default_tables_path())
+    return _tables
+
+
+def pack_grid(grid):
+    """Nén grid 4x4 (list of lists) thành số nguyên 64-bit. Raise ValueError nếu ô > 32768."""
+    board = 0
+    shift = 0
+    try:
+        for row in grid:
+            for value in row:
+                board |= EXPONENT_OF[value] << shift
+                shift += 4
+    except KeyError:
+        raise ValueError("Giá trị ô không biểu diễn được trong 4 bit")
+    return board
+
+
+def unpack_board(board):
+    """Giải nén số nguyên 64-bit thành grid (list of lists)."""
+    pairs = PAIR_VALUES
+    return [
+        list(pairs[board & 0xFF] + pairs[(board >> 8) & 0xFF]),
+        list(pairs[(board >> 16) & 0xFF] + pairs[(board >> 24) & 0xFF]),
+        list(pairs[(board >> 32) & 0xFF] + pairs[(board >> 40) & 0xFF]),
+        list(pairs[(board >> 48) & 0xFF] + pairs[board >> 56]),
+    ]
+
+
+def empty_cells(board):
+    """Danh sách (r, c) các ô trống, theo thứ tự hàng như Game2048.random_empty_cell()."""
+    empty_mask = get_tables()["empty_mask"]
+    return [
+        (r, c)
+        for r in range(SIZE)
+        for c in MASK_CELLS[empty_mask[(board >> (16 * r)) & ROW_MASK]]
+    ]
+
+
+def add_random_tile(board, rng=random):
+    """
+    Thêm ô mới (2 hoặc 4) vào bàn cờ 64-bit.
+    Dùng random giống Game2048.add_random_tile() nên cùng seed cho cùng kết quả.
+    Trả về (bàn cờ mới, {"r", "c"} hoặc None).
+    """
+    tables = get_tables()
+    empty_count = tables["empty_count"]
+    rows = (board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48)
+    count = empty_count[rows[0]] + empty_count[rows[1]] + empty_count[rows[2]] + empty_count[rows[3]]
+    if not count:
+        return board, None
+    # randrange(n) cho cùng chỉ số như choice() trên danh sách empty_cells() (kể cả random.Random)
+    index = rng.randrange(count)
+    r = 0
+    while index >= empty_count[rows[r]]:
+        index -= empty_count[rows[r]]
+        r += 1
+    c = MASK_CELLS[tables["empty_mask"][rows[r]]][index]
+    exponent = 1 if rng.random() < 0.9 else 2
+    return board | (exponent << (4 * (SIZE * r + c))), {"r": r, "c": c}
+
+
+def spawn_tile(board, seed, nonce):
+    """
+    add_random_tile(board, tile_rng(seed, nonce)) viết gọn cho move(): cùng ô và
+    giá trị nhưng hai lần splitmix64 tính tại chỗ, không tạo TileRng.
+    Trả về (bàn cờ mới, {"r", "c"} hoặc None, số ô trống trước khi thêm).
+    """
+    tables = _tables or get_tables()
+    empty_count = tables["empty_count"]
+    row0, row1, row2, row3 = board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48
+    c0, c1, c2 = empty_count[row0], empty_count[row1], empty_count[row2]
+    count = c0 + c1 + c2 + empty_count[row3]
+    if not count:
+        return board, None, 0
+
+    hasher = _seed_hasher.copy()
+    hasher.update(_NONCE.pack(seed, nonce))
+    state = (int.from_bytes(hasher.digest(), "little") + GOLDEN) & MASK64
+    z = ((state ^ (state >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    index = int(((z ^ (z >> 31)) >> 11) * UNIT * count)
+    state = (state + GOLDEN) & MASK64
+    z = ((state ^ (state >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    exponent = 1 if ((z ^ (z >> 31)) >> 11) * UNIT < 0.9 else 2
+
+    if index < c0:
+        r, row = 0, row0
+    elif index < c0 + c1:
+        r, row, index = 1, row1, index - c0
+    elif index < c0 + c1 + c2:
+        r, row, index = 2, row2, index - c0 - c1
+    else:
+        r, row, index = 3, row3, index - c0 - c1 - c2
+    c = MASK_CELLS[tables["empty_mask"][row]][index]
+    return board | (exponent << (4 * (SIZE * r + c))), {"r": r, "c": c}, count
+
+
+def transpose(board):
+    """Chuyển vị bàn cờ 64-bit (đổi hàng thành cột)."""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def execute_move(board, direction):
+    """
+    Thực hiện nước đi trên bàn cờ 64-bit.
+    Trả về (bàn cờ mới, điểm cộng thêm, danh sách merged_cells).
+    merged_cells dùng cùng quy ước toạ độ với Game2048.move().
+    Raise OverflowError nếu nước đi tạo ra ô lớn hơn 32768.
+    """
+    moved, scores, merges, cells_of = (_tables or get_tables())[direction]
+    vertical = direction == "up" or direction == "down"
+    if vertical:
+        # Hàng r của bàn cờ chuyển vị là cột r; bảng up/down trả về cột ở bit 4 * r
+        board = transpose(board)
+        step = 4
+    else:
+        step = 16
+
+    row0, row1, row2, row3 = board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48
+    r0, r1, r2, r3 = moved[row0], moved[row1], moved[row2], moved[row3]
+    if r0 < 0 or r1 < 0 or r2 < 0 or r3 < 0:
+        raise OverflowError("Ô vượt quá 32768")
+    new_board = r0 | (r1 << step) | (r2 << 2 * step) | (r3 << 3 * step)
+    gained = scores[row0] + scores[row1] + scores[row2] + scores[row3]
+
+    merged_cells = []
+    if gained:
+        for r, row in enumerate((row0, row1, row2, row3)):
+            for c in cells_of[merges[row]]:
+                if vertical:
+                    merged_cells.append({"r": c, "c": r})
+                else:
+                    merged_cells.append({"r": r, "c": c})
+    return new_board, gained, merged_cells
+
+
+def move_board(board, direction):
+    """
+    Chỉ tính bàn cờ mới (không tính điểm/merged_cells) - dùng cho tìm kiếm.
+    Raise OverflowError nếu nước đi tạo ra ô lớn hơn 32768.
+    """
+    moved = get_tables()["right" if direction in ("right", "down") else "left"][0]
+    vertical = direction in ("up", "down")
+    if vertical:
+        board = transpose(board)
+    r0 = moved[board & ROW_MASK]
+    r1 = moved[(board >> 16) & ROW_MASK]
+    r2 = moved[(board >> 32) & ROW_MASK]
+    r3 = moved[board >> 48]
+    if r0 < 0 or r1 < 0 or r2 < 0 or r3 < 0:
+        raise OverflowError("Ô vượt quá 32768")
+    new_board = r0 | (r1 << 16) | (r2 << 32) | (r3 << 48)
+    return transpose(new_board) if vertical else new_board
+
+
+def move_and_score(board, direction):
+    """
+    Như move_board() nhưng trả về thêm điểm cộng: (bàn cờ mới, điểm).
+    Raise OverflowError nếu nước đi tạo ra ô lớn hơn 32768.
+    """
+    moved, scores = get_tables()["right" if direction in ("right", "down") else "left"][:2]
+    vertical = direction in ("up", "down")
+    if vertical:
+        board = transpose(board)
+    new_board = 0
+    gained = 0
+    for shift in (0, 16, 32, 48):
+        row = (board >> shift) & ROW_MASK
+        result = moved[row]
+        if result < 0:
+            raise OverflowError("Ô vượt quá 32768")
+        new_board |= result << shift
+        gained += scores[row]
+    return (transpose(new_board) if vertical else new_board), gained
+
+
+def max_tile(board):
+    """Giá trị ô lớn nhất trên bàn cờ 64-bit."""
+    row_max = get_tables()["row_max"]
+    exponent = max(row_max[board & ROW_MASK], row_max[(board >> 16) & ROW_MASK],
+                   row_max[(board >> 32) & ROW_MASK], row_max[board >> 48])
+    return (1 << exponent) if exponent else 0
+
+
+def board_stats(board):
+    """
+    Thống kê bàn cờ bằng tra bảng theo hàng: (số ô trống, số mũ ô lớn nhất, còn nước đi).
+    Chỉ chuyển vị để xét gộp theo cột khi bàn cờ đã đầy.
+    """
+    tables = get_tables()
+    empty_count = tables["empty_count"]
+    row_max = tables["row_max"]
+    row_merge = tables["row_merge"]
+    rows = (board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48)
+
+    empty = empty_count[rows[0]] + empty_count[rows[1]] + empty_count[rows[2]] + empty_count[rows[3]]
+    exponent = max(row_max[rows[0]], row_max[rows[1]], row_max[rows[2]], row_max[rows[3]])
+    movable = empty > 0 or row_merge[rows[0]] or row_merge[rows[1]] or row_merge[rows[2]] or row_merge[rows[3]]
+    if not movable:
+        cols = transpose(board)
+        movable = (row_merge[cols & ROW_MASK] or row_merge[(cols >> 16) & ROW_MASK]
+                   or row_merge[(cols >> 32) & ROW_MASK] or row_merge[cols >> 48])
+    return empty, exponent, bool(movable)
+
+
+# Slot grid của Game2048 - BitboardGame2048 dùng làm bản giải nén (cache) của bàn cờ 64-bit
+_GRID_SLOT = Game2048.grid
+
+
+class BitboardGame2048(Game2048):
+    """
+    Game2048 dùng bitboard + bảng tra cho move(); trạng thái là bàn cờ 64-bit
+    (`board`), grid chỉ được giải nén khi đọc (trả về client, lưu session).
+    Kết quả move() giống Game2048.move() nhưng không kèm grid.
+    Số ô trống, ô lớn nhất và khả năng còn nước đi được tính ngay trong move()
+    nên any_moves_left()/max_tile() chỉ là đọc giá trị đã lưu.
+
+    Bàn cờ có ô lớn hơn 32768 không nén được: khi đó board là None và grid là
+    trạng thái, các thao tác dùng engine gốc.
+
+    Lịch sử undo là ring buffer các delta (bàn cờ trước XOR bàn cờ sau,
+    điểm thay đổi, số nước thay đổi) - vài byte mỗi nước thay vì một bản sao grid.
+
+    Mỗi ván có seed và move log; ô mới ở vị trí log thứ n được sinh từ
+    tile_rng(seed, n + 2) nên có thể chơi lại (replay) chính xác phía server.
+    """
+
+    __slots__ = ("_board", "_stats", "history", "redo_stack", "seed", "log", "redo_log")
+
+    HISTORY_SIZE = 32
+
+    def __init__(self, size=4, history_size=None):
+        # (số ô trống, số mũ ô lớn nhất, còn nước đi) của bàn cờ hiện tại, None = chưa tính
+        self._stats = None
+        super().__init__(size)
+        self.history = deque(maxlen=history_size or self.HISTORY_SIZE)
+        self.redo_stack = []
+        self.seed = 0
+        self.log = ""
+        self.redo_log = []
+
+    @property
+    def board(self):
+        """Bàn cờ 64-bit hiện tại, None nếu có ô lớn hơn 32768."""
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        self._board = board
+        _GRID_SLOT.__set__(self, None)
+        self._stats = None
+
+    @property
+    def grid(self):
+        """Grid (list of lists), giải nén từ bàn cờ 64-bit ở lần đọc đầu."""
+        grid = _GRID_SLOT.__get__(self)
+        if grid is None:
+            grid = unpack_board(self._board)
+            _GRID_SLOT.__set__(self, grid)
+        return grid
+
+    @grid.setter
+    def grid(self, grid):
+        try:
+            self._board = pack_grid(grid)
+        except ValueError:
+            self._board = None
+        _GRID_SLOT.__set__(self, grid)
+        self._stats = None
+
+    def _sync_grid(self):
+        """Nén lại grid sau khi bị sửa tại chỗ (shuffle/swap)."""
+        self.grid = _GRID_SLOT.__get__(self)
+
+    def _current_stats(self):
+        """Thống kê của bàn cờ hiện tại, None nếu không nén được."""
+        if self._stats is None and self._board is not None:
+            self._stats = board_stats(self._board)
+        return self._stats
+
+    def _rng(self):
+        """RNG cho thao tác tiếp theo (ghi vào vị trí len(log) của move log)."""
+        return tile_rng(self.seed, len(self.log) + 2)
+
+    def _record(self, token, delta=None, score_delta=0, moves_delta=0):
+        """Ghi thao tác vào move log và delta vào lịch sử undo; thao tác mới xoá redo."""
+        self.log += token
+        if self.redo_stack or self.redo_log:
+            self.redo_stack.clear()
+            self.redo_log.clear()
+        if delta is None:
+            self.history.clear()
+        else:
+            self.history.append((delta, score_delta, moves_delta))
+
+    def clear_history(self):
+        """Xoá lịch sử undo/redo (bàn cờ không nén được 4 bit, hoặc undo của tài khoản thường)."""
+        self.history.clear()
+        self.redo_stack.clear()
+        self.redo_log.clear()
+
+    def setup(self, seed=None):
+        """Khởi tạo trò chơi mới (seed=None: seed ngẫu nhiên)."""
+        self.seed = new_seed() if seed is None else seed
+        self.log = ""
+        self.score = 0
+        self.moves = 0
+        self.game_over = False
+        self.last_state = None
+        self.clear_history()
+
+        board, first = add_random_tile(0, tile_rng(self.seed, 0))
+        board, second = add_random_tile(board, tile_rng(self.seed, 1))
+        self.board = board
+        return {"grid": self.grid, "score": self.score, "moves": self.moves, "new_tiles": [first, second]}
+
+    def add_random_tile(self):
+        """Thêm ô mới (2 hoặc 4) bằng RNG tất định của ván."""
+        if self._board is not None:
+            self.board, tile = add_random_tile(self._board, self._rng())
+            return tile
+        empties = [(r, c) for r in range(self.size) for c in range(self.size) if self.grid[r][c] == 0]
+        if not empties:
+            return None
+        rng = self._rng()
+        r, c = rng.choice(empties)
+        self.grid[r][c] = 2 if rng.random() < 0.9 else 4
+        return {"r": r, "c": c}
+
+    def move(self, direction):
+        """Xử lý di chuyển theo hướng (up, down, left, right) bằng bitboard."""
+        if self.game_over:
+            return {"changed": False}
+
+        board = self._board
+        try:
+            if board is None:
+                raise OverflowError
+            new_board, gained, merged_cells = execute_move(board, direction)
+        except OverflowError:
+            # Ô vượt quá 4 bit - dùng engine gốc (không hỗ trợ undo); kết quả cũng không kèm grid
+            result = super().move(direction)
+            result.pop("grid", None)
+            self.last_state = None
+            if result.get("changed"):
+                self._record(MOVE_TOKENS[direction])
+            return result
+
+        if new_board == board:
+            return {"score": self.score, "moves": self.moves, "changed": False, "merged_cells": []}
+
+        new_board, new_tile, empty = spawn_tile(new_board, self.seed, len(self.log) + 2)
+        self._record(MOVE_TOKENS[direction], board ^ new_board, gained, 1)
+        self._board = new_board
+        _GRID_SLOT.__set__(self, None)
+        self.score += gained
+        self.moves += 1
+        if empty > 1:
+            # Còn ô trống sau khi thêm ô mới: chỉ cần tìm ô lớn nhất
+            row_max = _tables["row_max"]
+            self._stats = (empty - 1, max(row_max[new_board & ROW_MASK], row_max[(new_board >> 16) & ROW_MASK],
+                                          row_max[(new_board >> 32) & ROW_MASK], row_max[new_board >> 48]), True)
+        else:
+            self._stats = board_stats(new_board)
+
+        return {
+            "score": self.score,
+            "moves": self.moves,
+            "changed": True,
+            "new_tile": [new_tile] if new_tile else [],
+            "merged_cells": merged_cells
+        }
+
+    def any_moves_left(self):
+        """Kiểm tra xem còn nước đi nào không (O(1) sau move())."""
+        stats = self._current_stats()
+        if stats is None:
+            return super().any_moves_left()
+        return stats[2]
+
+    def max_tile(self):
+        """Tìm ô có giá trị lớn nhất (O(1) sau move())."""
+        stats = self._current_stats()
+        if stats is None:
+            return super().max_tile()
+        return (1 << stats[1]) if stats[1] else 0
+
+    def undo_levels(self):
+        """Số bước có thể hoàn tác."""
+        return len(self.history)
+
+    def _replay_history(self, source, target, steps, sign):
+        """
+        Áp dụng tối đa `steps` delta từ source sang target (undo: sign=-1, redo: sign=1),
+        đồng thời chuyển ký hiệu tương ứng giữa move log và redo_log.
+        Trả về số bước đã áp dụng.
+        """
+        board = self._board
+        applied = 0
+        while applied < steps and source:
+            entry = source.pop()
+            delta, score_delta, moves_delta = entry
+            board ^= delta
+            self.score += sign * score_delta
+            self.moves += sign * moves_delta
+            target.append(entry)
+            if sign < 0:
+                # Ký hiệu swap kết thúc bằng chữ thường (ô a..p), các ký hiệu khác dài 1
+                width = 3 if self.log[-1].islower() else 1
+                self.redo_log.append(self.log[-width:])
+                self.log = self.log[:-width]
+            else:
+                self.log += self.redo_log.pop()
+            applied += 1
+        self.board = board
+        self.game_over = False
+        return applied
+
+    def undo(self, steps=1):
+        """Hoàn tác tối đa `steps` nước đi."""
+        if not self.history:
+            return {"grid": self.grid, "score": self.score, "moves": self.moves, "undone": 0}
+        undone = self._replay_history(self.history, self.redo_stack, steps, -1)
+        return {"grid": self.grid, "score": self.score, "moves": self.moves, "undone": undone}
+
+    def redo(self, steps=1):
+        """Làm lại tối đa `steps` nước đi vừa hoàn tác."""
+        if not self.redo_stack:
+            return {"grid": self.grid, "score": self.score, "moves": self.moves, "redone": 0}
+        redone = self._replay_history(self.redo_stack, self.history, steps, 1)
+        return {"grid": self.grid, "score": self.score, "moves": self.moves, "redone": redone}
+
+    def _record_edit(self, token, before):
+        """Ghi thay đổi bàn cờ không phải nước đi (shuffle/swap) vào log và lịch sử."""
+        self._sync_grid()
+        after = self._board
+        if before is None or after is None:
+            self._record(token)
+        elif after != before:
+            self._record(token, before ^ after)
+
+    def shuffle(self):
+        """Xáo trộn các ô trên bàn cờ bằng RNG tất định của ván (premium feature)"""
+        before = self._board
+        grid = self.grid
+        cells = [(r, c) for r in range(self.size) for c in range(self.size) if grid[r][c] != 0]
+        tiles = [grid[r][c] for r, c in cells]
+        self._rng().shuffle(tiles)
+        for (r, c), value in zip(cells, tiles):
+            grid[r][c] = value
+        self._record_edit(SHUFFLE_TOKEN, before)
+        return {"grid": self.grid}
+
+    def swap_two_tiles(self, row1, col1, row2, col2):
+        """Hoán đổi vị trí 2 ô (premium feature)"""
+        before = self._board
+        result = super().swap_two_tiles(row1, col1, row2, col2)
+        if result.get("ok"):
+            token = SWAP_TOKEN + chr(ord("a") + row1 * self.size + col1) + chr(ord("a") + row2 * self.size + col2)
+            self._record_edit(token, before)
+        return result
+
+    def get_hint(self, depth=3, node_budget=50000, table=None, deadline_ms=None, pool_size=0):
+        """Gợi ý nước đi tốt nhất bằng expectimax (premium feature)."""
+        from hint_solver import find_hint
+
+        if self._board is None:
+            return super().get_hint()
+        try:
+            return find_hint(self._board, depth, node_budget, table, deadline_ms, pool_size)
+        except OverflowError:
+            return super().get_hint()
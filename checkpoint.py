@@ -0,0 +1,176 @@
+"""
+Checkpoint ván đang chơi theo user (bảng saved_games) để chơi tiếp trên thiết bị khác.
+
+Ghi kiểu write-behind: mỗi nước đi chỉ cập nhật bộ đệm trong bộ nhớ; một
+thread nền gộp các thay đổi và ghi xuống DB khi user đã đi thêm N nước hoặc
+sau T giây, và khi game over (xoá checkpoint). Khi process thoát, bộ đệm
+được ghi nốt (atexit).
+
+Mỗi worker có bộ đệm riêng nên mỗi trạng thái mang version (thời điểm ghi
+nhận, ns) và chỉ ghi đè dòng có version nhỏ hơn: trạng thái cũ còn trong bộ
+đệm của worker khác không ghi đè checkpoint mới hơn. Game over ghi dấu xoá
+(data rỗng) thay vì DELETE để trạng thái cũ không tạo lại checkpoint của ván
+đã kết thúc; dấu xoá cũ được dọn bằng `flask purge-game-states`.
+"""
+
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+# data của dấu xoá checkpoint (game over)
+TOMBSTONE = b""
+
+
+class CheckpointBuffer:
+    """Bộ đệm write-behind: user_id -> (bytes game, số nước đi, version) mới nhất chưa ghi."""
+
+    def __init__(self, engine, table, every_moves=20, interval=10.0):
+        self.engine = engine
+        self.table = table
+        self.every_moves = every_moves
+        self.interval = interval
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_deleted = 0
+        self.records = 0
+        self._dirty = {}
+        self._flushing = {}
+        self._flushed_moves = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="checkpoint-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, user_id, data, moves):
+        """Ghi nhận trạng thái mới nhất của user (không chạm DB)."""
+        with self._lock:
+            self.records += 1
+            self._dirty[user_id] = (data, moves, time.time_ns())
+            flushed = self._flushed_moves.get(user_id)
+            if flushed is None or abs(moves - flushed) >= self.every_moves:
+                # Checkpoint đầu tiên hoặc đã lệch N nước - ghi sớm, không chờ hết T giây
+                self._wake.set()
+
+    def discard(self, user_id):
+        """Game over: xoá checkpoint của user ở lần ghi tới (ngay lập tức)."""
+        with self._lock:
+            self._dirty[user_id] = (TOMBSTONE, 0, time.time_ns())
+            self._wake.set()
+
+    def get(self, user_id):
+        """Bytes checkpoint mới nhất của user (bộ đệm trước, rồi DB), hoặc None."""
+        with self._lock:
+            pending = self._dirty.get(user_id, self._flushing.get(user_id))
+        if pending is not None:
+            return pending[0] or None
+        with self.engine.connect() as conn:
+            data = conn.execute(select(self.table.c.data).where(self.table.c.user_id == user_id)).scalar()
+        return data or None
+
+    def flush(self):
+        """Ghi toàn bộ thay đổi đang chờ trong một transaction."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            # get() vẫn đọc được các trạng thái đang ghi dở
+            self._flushing = dirty
+        if not dirty:
+            return
+
+        table = self.table
+        now = datetime.now()
+        try:
+            with self.engine.begin() as conn:
+                for user_id, (data, moves, version) in dirty.items():
+                    values = {"data": data, "moves": moves, "version": version, "updated_at": now}
+                    result = conn.execute(
+                        update(table).where(table.c.user_id == user_id, table.c.version < version).values(**values)
+                    )
+                    # Không cập nhật được: chưa có dòng, hoặc worker khác đã ghi trạng thái mới hơn.
+                    # Hai worker cùng chèn dòng đầu tiên thì lô thua bị lỗi khoá chính và ghi lại sau
+                    if not result.rowcount and conn.execute(
+                        select(table.c.user_id).where(table.c.user_id == user_id)
+                    ).first() is None:
+                        conn.execute(insert(table).values(user_id=user_id, **values))
+        except Exception:
+            # Ghi lỗi: trả lại bộ đệm (trừ user đã có trạng thái mới hơn) để thử lại
+            with self._lock:
+                for user_id, entry in dirty.items():
+                    self._dirty.setdefault(user_id, entry)
+                self._flushing = {}
+            raise
+
+        with self._lock:
+            self._flushing = {}
+            self.flushes += 1
+            for user_id, (data, moves, _) in dirty.items():
+                if data == TOMBSTONE:
+                    self.rows_deleted += 1
+                    self._flushed_moves.pop(user_id, None)
+                else:
+                    self.rows_written += 1
+                    self._flushed_moves[user_id] = moves
+
+    def purge_tombstones(self, max_age):
+        """Xoá dấu xoá cũ hơn `max_age` giây (không còn trạng thái nào cũ hơn đang chờ ghi). Trả về số dòng."""
+        cutoff = datetime.now() - timedelta(seconds=max_age)
+        table = self.table
+        with self.engine.begin() as conn:
+            return conn.execute(
+                delete(table).where(table.c.data == TOMBSTONE, table.c.updated_at < cutoff)
+            ).rowcount
+
+    def _run(self):
+        """Thread nền: ghi sau mỗi T giây hoặc khi được đánh thức."""
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f">>> Checkpoint flush error: {e}")
+                time.sleep(1.0)
+
+    def close(self):
+        """Dừng thread nền (chờ nó thoát) và ghi nốt bộ đệm."""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f">>> Checkpoint flush error: {e}")
+
+    def stats(self):
+        """Bộ đếm: số lần record so với số dòng thực sự ghi xuống DB."""
+        return {
+            "pending": len(self._dirty),
+            "records": self.records,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_deleted": self.rows_deleted,
+        }
+
+
+def get_checkpoints(config):
+    """CheckpointBuffer dùng chung trong process (tạo trong app context)."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                from config import db
+                from models import SavedGame
+
+                _buffer = CheckpointBuffer(
+                    db.engine, SavedGame.__table__,
+                    config["CHECKPOINT_EVERY_MOVES"], config["CHECKPOINT_INTERVAL_SEC"]
+                )
+    return _buffer
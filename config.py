@@ -63,6 +63,49 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 app.config["REMEMBER_COOKIE_DURATION"] = timedelta(days=7)
 app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
 
+# Nơi lưu trạng thái game: cookie (mặc định), memory, sql, redis (xem game_store.py)
+app.config["GAME_STORE"] = os.getenv("GAME_STORE", "cookie")
+app.config["GAME_STORE_TTL"] = int(os.getenv("GAME_STORE_TTL", 7 * 86400))
+app.config["GAME_STORE_MAX_ENTRIES"] = int(os.getenv("GAME_STORE_MAX_ENTRIES", 100000))
+app.config["REDIS_URL"] = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Checkpoint ván đang chơi theo user (bảng saved_games): ghi sau N nước hoặc T giây
+app.config["CHECKPOINT_EVERY_MOVES"] = int(os.getenv("CHECKPOINT_EVERY_MOVES", 20))
+app.config["CHECKPOINT_INTERVAL_SEC"] = float(os.getenv("CHECKPOINT_INTERVAL_SEC", 10))
+
+# Ghi điểm game over: async (hàng đợi write-behind, ghi theo lô N ván / T ms) hoặc sync
+app.config["SCORE_INGEST"] = os.getenv("SCORE_INGEST", "async")
+app.config["SCORE_INGEST_BATCH_SIZE"] = int(os.getenv("SCORE_INGEST_BATCH_SIZE", 100))
+app.config["SCORE_INGEST_INTERVAL_MS"] = int(os.getenv("SCORE_INGEST_INTERVAL_MS", 200))
+# File spool cho các ván chưa ghi được khi tắt process (nên đặt trên ổ bền vững)
+app.config["SCORE_INGEST_SPOOL"] = os.getenv(
+    "SCORE_INGEST_SPOOL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "score_ingest.spool")
+)
+
+# Thứ hạng toàn cục (/api/rank): điểm tối đa của histogram, chu kỳ dựng lại từ user_best
+app.config["RANK_MAX_SCORE"] = int(os.getenv("RANK_MAX_SCORE", 1000000))
+app.config["RANK_REFRESH_SEC"] = float(os.getenv("RANK_REFRESH_SEC", 300))
+
+# Số bước undo tối đa lưu trong game state (mỗi bước ~13 byte trong session)
+app.config["UNDO_HISTORY_SIZE"] = int(os.getenv("UNDO_HISTORY_SIZE", 32))
+
+# Số nước đi tối đa trong một request /api/moves
+app.config["MOVE_BATCH_MAX"] = int(os.getenv("MOVE_BATCH_MAX", 64))
+
+# Hint engine (expectimax) - giới hạn độ sâu và số nút để chặn độ trễ
+app.config["HINT_SEARCH_DEPTH"] = int(os.getenv("HINT_SEARCH_DEPTH", 6))
+app.config["HINT_NODE_BUDGET"] = int(os.getenv("HINT_NODE_BUDGET", 50000))
+app.config["HINT_CACHE_MAX_ENTRIES"] = int(os.getenv("HINT_CACHE_MAX_ENTRIES", 100000))
+# Deadline cứng cho mỗi lần gợi ý (iterative deepening), 0 = tắt
+app.config["HINT_DEADLINE_MS"] = int(os.getenv("HINT_DEADLINE_MS", 250))
+# Số process chia hướng gốc, 0/1 = tìm tuần tự trong worker
+app.config["HINT_POOL_SIZE"] = int(os.getenv("HINT_POOL_SIZE", 0))
+# Tính trước gợi ý sau mỗi nước đi của user premium (thread nền, bỏ qua khi quá tải)
+app.config["HINT_SPECULATE"] = os.getenv("HINT_SPECULATE", "0") == "1"
+app.config["HINT_SPECULATE_WORKERS"] = int(os.getenv("HINT_SPECULATE_WORKERS", 1))
+app.config["HINT_SPECULATE_MAX_PENDING"] = int(os.getenv("HINT_SPECULATE_MAX_PENDING", 4))
+app.config["HINT_SPECULATE_CACHE_SIZE"] = int(os.getenv("HINT_SPECULATE_CACHE_SIZE", 10000))
+
 # Google OAuth configuration
 app.config["GOOGLE_CLIENT_ID"] = os.getenv("GOOGLE_CLIENT_ID", "")
 app.config["GOOGLE_CLIENT_SECRET"] = os.getenv("GOOGLE_CLIENT_SECRET", "")
@@ -96,4 +139,4 @@ safe_url = db_url.split("@")[-1] if "@" in db_url else db_url
 print(">>> Using DB:", ("mysql+pymysql://***@" + safe_url) if "mysql" in db_url else db_url)
 
 # KHÔNG tạo bảng ở đây! Models chưa được import
-# db.create_all() sẽ được gọi trong app.py sau khi import models
+# Bảng được tạo bằng `flask db-migrate` (schema_migrations.py)
@@ -0,0 +1,39 @@
+"""
+Quyền Premium tính từ user đã nạp sẵn, không ghi database.
+
+Thay cho User.check_premium_status() ở mỗi request (có thể commit giữa
+request khi phát hiện hết hạn): Flask-Login đã đọc dòng User ở đầu mỗi
+request nên còn hiệu lực hay không chỉ là so sánh premium_expires_at với
+thời điểm hiện tại - thanh toán hay huỷ Premium có hiệu lực ngay ở mọi
+worker. Cờ is_premium của các gói đã hết hạn được tắt hàng loạt bằng
+`flask expire-premium` (chạy định kỳ bằng cron) thay vì commit lẻ từng request.
+"""
+
+from datetime import datetime
+
+from flask_login import current_user
+from sqlalchemy import update
+
+from config import app, db
+from models import User
+
+
+@app.template_global()
+def has_premium(user=None):
+    """Premium còn hiệu lực không (không ghi database)."""
+    user = user or current_user
+    if not user.is_authenticated or not user.is_premium or not user.premium_expires_at:
+        return False
+    return datetime.now() <= user.premium_expires_at
+
+
+def expire_lapsed(now=None):
+    """Tắt is_premium của mọi gói đã hết hạn bằng một UPDATE. Trả về số user."""
+    result = db.session.execute(
+        update(User)
+        .where(User.is_premium.is_(True), User.premium_expires_at < (now or datetime.now()))
+        .values(is_premium=False)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
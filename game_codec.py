@@ -0,0 +1,196 @@
+"""
+Binary codec cho trạng thái game lưu trong session.
+
+Định dạng (little-endian, phiên bản 2):
+    B   version
+    B   flags (bit 0: game_over, bit 1: có undo, bit 2: bàn cờ rộng)
+    Q   bàn cờ 64-bit (hoặc 16 byte số mũ nếu bàn cờ rộng)
+    I   score
+    I   moves
+    [nếu có undo: bàn cờ, score, moves của last_state]
+    H   số delta trong lịch sử undo
+    H   số delta trong redo stack
+    QIB mỗi delta: bàn cờ XOR, điểm thay đổi, số nước thay đổi
+    (từ phiên bản 3)
+    Q   seed
+    ... move log: nước đi nén 2 bit mỗi nước, shuffle/swap lưu riêng theo vị trí
+    B   độ dài redo_log (ký hiệu ghép lại) + các ký hiệu
+
+Trạng thái thông thường chỉ vài chục byte cộng 13 byte mỗi bước undo và
+2 bit mỗi nước đi, thay cho JSON của toàn bộ __dict__. Phiên bản 1, 2
+vẫn giải mã được.
+"""
+
+import struct
+
+from bitboard import BitboardGame2048, log_tokens, pack_grid, unpack_board
+
+CODEC_VERSION = 3
+SUPPORTED_VERSIONS = (1, 2, 3)
+
+FLAG_GAME_OVER = 0x01
+FLAG_UNDO = 0x02
+FLAG_WIDE = 0x04
+
+_HEADER = struct.Struct("<BB")
+_NARROW = struct.Struct("<QII")
+_WIDE = struct.Struct("<16sII")
+_COUNTS = struct.Struct("<HH")
+_DELTA = struct.Struct("<QIB")
+_SEED = struct.Struct("<Q")
+_LOG_HEADER = struct.Struct("<IH")
+_SPECIAL = struct.Struct("<IB")
+
+# Nước đi <-> chữ số cơ số 4; mỗi chữ số hex là 2 nước đi
+_MOVE_DIGITS = str.maketrans("LRUD", "0123")
+_HEX_MOVES = str.maketrans({
+    format(i, "x"): "LRUD"[i >> 2] + "LRUD"[i & 3] for i in range(16)
+})
+
+
+def pack_log(log):
+    """
+    Nén move log: các nước đi 2 bit mỗi nước, các ký hiệu khác (shuffle/swap)
+    lưu kèm vị trí trong log.
+    """
+    specials = [(position, token) for position, token in log_tokens(log) if token not in "LRUD"]
+    moves = log
+    for position, token in reversed(specials):
+        moves = moves[:position] + moves[position + len(token):]
+
+    parts = [_LOG_HEADER.pack(len(moves), len(specials))]
+    for position, token in specials:
+        parts.append(_SPECIAL.pack(position, len(token)) + token.encode("ascii"))
+    if moves:
+        digits = moves.translate(_MOVE_DIGITS)
+        parts.append(int(digits, 4).to_bytes((len(moves) + 3) // 4, "big"))
+    return b"".join(parts)
+
+
+def unpack_log(data, offset=0):
+    """Giải nén move log. Trả về (log, offset sau log)."""
+    move_count, special_count = _LOG_HEADER.unpack_from(data, offset)
+    offset += _LOG_HEADER.size
+    specials = []
+    for _ in range(special_count):
+        position, width = _SPECIAL.unpack_from(data, offset)
+        offset += _SPECIAL.size
+        specials.append((position, data[offset:offset + width].decode("ascii")))
+        offset += width
+
+    size = (move_count + 3) // 4
+    packed = data[offset:offset + size]
+    if len(packed) != size:
+        raise ValueError("Move log bị cắt cụt")
+    offset += size
+    moves = ""
+    if move_count:
+        moves = format(int.from_bytes(packed, "big"), "x").zfill(2 * size).translate(_HEX_MOVES)
+        moves = moves[len(moves) - move_count:]
+
+    log = moves
+    for position, token in specials:
+        log = log[:position] + token + log[position:]
+    return log, offset
+
+
+def _exponents(grid):
+    """16 byte số mũ (1 byte mỗi ô) cho bàn cờ có ô lớn hơn 32768."""
+    return bytes(v.bit_length() - 1 if v else 0 for row in grid for v in row)
+
+
+def _grid_from_exponents(data):
+    """Giải mã 16 byte số mũ thành grid."""
+    cells = [(1 << e) if e else 0 for e in data]
+    return [cells[r * 4:(r + 1) * 4] for r in range(4)]
+
+
+def encode_game(g):
+    """Mã hoá game (size 4) thành bytes."""
+    if g.size != 4:
+        raise ValueError("Codec chỉ hỗ trợ bàn cờ 4x4")
+
+    undo = g.last_state
+    try:
+        # BitboardGame2048 giữ sẵn bàn cờ 64-bit (None nếu có ô lớn hơn 32768)
+        board = g.board if isinstance(g, BitboardGame2048) else pack_grid(g.grid)
+        if board is None:
+            raise ValueError
+        boards = [board] if undo is None else [board, pack_grid(undo["grid"])]
+        wide = False
+    except ValueError:
+        grids = [g.grid] if undo is None else [g.grid, undo["grid"]]
+        boards = [_exponents(grid) for grid in grids]
+        wide = True
+
+    flags = 0
+    if g.game_over:
+        flags |= FLAG_GAME_OVER
+    if undo is not None:
+        flags |= FLAG_UNDO
+    if wide:
+        flags |= FLAG_WIDE
+
+    body = _WIDE if wide else _NARROW
+    parts = [_HEADER.pack(CODEC_VERSION, flags), body.pack(boards[0], g.score, g.moves)]
+    if undo is not None:
+        parts.append(body.pack(boards[1], undo["score"], undo["moves"]))
+
+    history = getattr(g, "history", ())
+    redo_stack = getattr(g, "redo_stack", ())
+    parts.append(_COUNTS.pack(len(history), len(redo_stack)))
+    parts.extend(_DELTA.pack(*entry) for entry in history)
+    parts.extend(_DELTA.pack(*entry) for entry in redo_stack)
+
+    redo_log = "".join(getattr(g, "redo_log", ()))
+    parts.append(_SEED.pack(getattr(g, "seed", 0)))
+    parts.append(pack_log(getattr(g, "log", "")))
+    parts.append(struct.pack("<H", len(redo_log)) + redo_log.encode("ascii"))
+    return b"".join(parts)
+
+
+def decode_game(data, cls=BitboardGame2048, history_size=None):
+    """Giải mã bytes thành game. Raise ValueError nếu dữ liệu không hợp lệ."""
+    try:
+        version, flags = _HEADER.unpack_from(data, 0)
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"Phiên bản codec không hỗ trợ: {version}")
+
+        wide = flags & FLAG_WIDE
+        body = _WIDE if wide else _NARROW
+        grid_of = _grid_from_exponents if wide else unpack_board
+
+        g = cls(history_size=history_size)
+        offset = _HEADER.size
+        board, g.score, g.moves = body.unpack_from(data, offset)
+        offset += body.size
+        if wide:
+            g.grid = grid_of(board)
+        else:
+            g.board = board
+        g.game_over = bool(flags & FLAG_GAME_OVER)
+        if flags & FLAG_UNDO:
+            board, score, moves = body.unpack_from(data, offset)
+            offset += body.size
+            g.last_state = {"grid": grid_of(board), "score": score, "moves": moves}
+
+        if version >= 2:
+            history_count, redo_count = _COUNTS.unpack_from(data, offset)
+            offset += _COUNTS.size
+            entries = [
+                _DELTA.unpack_from(data, offset + i * _DELTA.size)
+                for i in range(history_count + redo_count)
+            ]
+            g.history.extend(entries[:history_count])
+            g.redo_stack.extend(entries[history_count:])
+            offset += len(entries) * _DELTA.size
+
+        if version >= 3:
+            (g.seed,) = _SEED.unpack_from(data, offset)
+            g.log, offset = unpack_log(data, offset + _SEED.size)
+            (length,) = struct.unpack_from("<H", data, offset)
+            redo_log = data[offset + 2:offset + 2 + length].decode("ascii")
+            g.redo_log = [token for _, token in log_tokens(redo_log)]
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Dữ liệu game không hợp lệ: {e}")
+    return g
@@ -2,6 +2,8 @@ import random
 import copy
 
 class Game2048:
+    __slots__ = ("size", "grid", "score", "moves", "game_over", "last_state", "best")
+
     def __init__(self, size=4):
         self.size = size
         self.grid = self.empty_grid()
@@ -169,6 +171,10 @@ class Game2048:
         self.last_state = None
         return {"grid": self.grid, "score": self.score, "moves": self.moves}
 
+    def undo_levels(self):
+        """Số bước có thể hoàn tác."""
+        return 1 if self.last_state else 0
+
     def check_game_over(self):
         """Kiểm tra trạng thái game over."""
         if not self.any_moves_left():
@@ -0,0 +1,254 @@
+"""
+Kho lưu trạng thái game phía server.
+
+Session cookie chỉ giữ game id; bytes của game (game_codec) nằm trong một
+backend chọn bằng GAME_STORE:
+    cookie  - giữ nguyên như trước: bytes nằm trong session (mặc định); game
+              có move log quá dài cho cookie được chuyển sang bảng game_states
+    memory  - LRU trong process, có TTL (chỉ dùng khi 1 worker hoặc sticky session)
+    sql     - bảng game_states trong database hiện tại (SQLite/MySQL)
+    redis   - Redis hoặc server tương thích giao thức RESP (REDIS_URL)
+"""
+
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import unquote, urlparse
+
+from sqlalchemy import delete, insert, select, update
+
+BACKENDS = ("cookie", "memory", "sql", "redis")
+
+_store = None
+_overflow_store = None
+_store_lock = threading.Lock()
+
+
+class GameStore:
+    """Giao diện kho lưu: bytes theo game id."""
+
+    def get(self, game_id):
+        """Bytes đã lưu, hoặc None nếu không có / hết hạn."""
+        raise NotImplementedError
+
+    def set(self, game_id, data):
+        """Lưu bytes cho game id."""
+        raise NotImplementedError
+
+    def delete(self, game_id):
+        """Xoá game id (không lỗi nếu không có)."""
+        raise NotImplementedError
+
+
+class MemoryGameStore(GameStore):
+    """LRU trong process với TTL tính từ lần ghi cuối."""
+
+    def __init__(self, max_entries=100000, ttl=7 * 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, game_id):
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[game_id]
+                return None
+            self._entries.move_to_end(game_id)
+            return data
+
+    def set(self, game_id, data):
+        with self._lock:
+            self._entries[game_id] = (data, time.monotonic() + self.ttl)
+            self._entries.move_to_end(game_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, game_id):
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+
+class SQLGameStore(GameStore):
+    """
+    Bảng game_states (models.GameState). Dùng connection riêng của engine nên
+    không commit lẫn dữ liệu đang chờ trong db.session của request.
+    """
+
+    def __init__(self, engine, table, ttl=7 * 86400):
+        self.engine = engine
+        self.table = table
+        self.ttl = ttl
+
+    def get(self, game_id):
+        table = self.table
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.data, table.c.updated_at).where(table.c.id == game_id)
+            ).first()
+        if row is None:
+            return None
+        if (datetime.now() - row.updated_at).total_seconds() > self.ttl:
+            self.delete(game_id)
+            return None
+        return row.data
+
+    def set(self, game_id, data):
+        table = self.table
+        now = datetime.now()
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(table).where(table.c.id == game_id).values(data=data, updated_at=now)
+            )
+            if not result.rowcount:
+                conn.execute(insert(table).values(id=game_id, data=data, updated_at=now))
+
+    def delete(self, game_id):
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.id == game_id))
+
+    def purge_expired(self):
+        """Xoá các game hết hạn. Trả về số dòng đã xoá."""
+        cutoff = datetime.fromtimestamp(time.time() - self.ttl)
+        with self.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.updated_at < cutoff)).rowcount
+
+
+class RedisError(Exception):
+    """Lỗi trả về từ server Redis."""
+
+
+class RedisGameStore(GameStore):
+    """
+    Client RESP tối giản (GET/SET EX/DEL) - không cần thư viện redis.
+    Mỗi thread giữ một kết nối; kết nối lỗi được mở lại ở lần gọi sau.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", ttl=7 * 86400, prefix="game:", timeout=2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._command(b"AUTH", self.password)
+        if self.db:
+            self._command(b"SELECT", self.db)
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _read_reply(self):
+        reader = self._local.reader
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Kết nối Redis bị đóng")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode(errors="replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Reply không hợp lệ: {line!r}")
+
+    def _command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._local.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """Gửi một lệnh, tự kết nối lại một lần nếu kết nối cũ đã hỏng."""
+        for attempt in range(2):
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            try:
+                return self._command(*args)
+            except (ConnectionError, OSError):
+                self._close()
+                if attempt:
+                    raise
+
+    def get(self, game_id):
+        return self.execute(b"GET", self.prefix + game_id)
+
+    def set(self, game_id, data):
+        self.execute(b"SET", self.prefix + game_id, data, b"EX", self.ttl)
+
+    def delete(self, game_id):
+        self.execute(b"DEL", self.prefix + game_id)
+
+
+def create_store(config):
+    """Tạo backend theo config. Trả về None với backend cookie."""
+    backend = config["GAME_STORE"]
+    if backend not in BACKENDS:
+        raise ValueError(f"GAME_STORE không hợp lệ: {backend}")
+    ttl = config["GAME_STORE_TTL"]
+    if backend == "memory":
+        return MemoryGameStore(config["GAME_STORE_MAX_ENTRIES"], ttl)
+    if backend == "sql":
+        from config import db
+        from models import GameState
+
+        return SQLGameStore(db.engine, GameState.__table__, ttl)
+    if backend == "redis":
+        return RedisGameStore(config["REDIS_URL"], ttl)
+    return None
+
+
+def get_store(config):
+    """Backend dùng chung trong process (None = lưu trong cookie)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store(config) or False
+    return _store or None
+
+
+def get_overflow_store(config):
+    """
+    Bảng game_states cho game của backend cookie đã vượt giới hạn cookie (move
+    log dài): session chỉ giữ game id như các backend khác.
+    """
+    global _overflow_store
+    if _overflow_store is None:
+        with _store_lock:
+            if _overflow_store is None:
+                from config import db
+                from models import GameState
+
+                _overflow_store = SQLGameStore(db.engine, GameState.__table__, config["GAME_STORE_TTL"])
+    return _overflow_store
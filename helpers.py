@@ -1,7 +1,22 @@
-from flask import session
+import uuid
+from flask import current_app, g as request_state, session
+from flask_login import current_user
 from game_logic import Game2048
-from config import db, login_manager
+from bitboard import BitboardGame2048, set_seed_key
+from game_codec import decode_game, encode_game
+from game_store import get_overflow_store, get_store
+from checkpoint import get_checkpoints
+from config import app, db, login_manager
 from models import User
+from scoring import issue_game
+
+# Khoá trộn vào seed của ván chơi (xem bitboard.tile_rng)
+set_seed_key(app.config["SECRET_KEY"])
+
+# Game nhỏ hơn mức này chắc chắn vừa cookie, không cần tính kích thước cookie
+COOKIE_STATE_FAST_BYTES = 1024
+# Chừa chỗ cho tên và các thuộc tính của cookie session (Path, Expires, ...)
+COOKIE_HEADER_RESERVE = 256
 
 
 @login_manager.user_loader
@@ -10,18 +25,125 @@ def load_user(user_id):
     return db.session.get(User, int(user_id))
 
 
+def _game_store():
+    """
+    Backend lưu game của session, None nếu lưu trong cookie. Với backend cookie,
+    game đã chuyển khỏi cookie (session có game_id) nằm trong bảng game_states.
+    """
+    store = get_store(current_app.config)
+    if store is None and session.get("game_id"):
+        return get_overflow_store(current_app.config)
+    return store
+
+
+def _fits_cookie(data):
+    """Session cookie chứa bytes game này có nằm trong MAX_COOKIE_SIZE (4 KB) không."""
+    if len(data) <= COOKIE_STATE_FAST_BYTES:
+        return True
+    state = dict(session, game_state=data)
+    state.pop("game_id", None)
+    cookie = current_app.session_interface.get_signing_serializer(current_app).dumps(state)
+    return len(cookie) + COOKIE_HEADER_RESERVE <= current_app.config["MAX_COOKIE_SIZE"]
+
+
+def _stored_state():
+    """
+    Bytes (hoặc dict cũ) của game hiện tại, đọc tối đa một lần mỗi request.
+    Bytes đọc được cũng là mốc so sánh cho dirty tracking trong save_game().
+    Session chưa có game thì chơi tiếp checkpoint của user (nếu có).
+    """
+    if "game_state" not in request_state:
+        store = _game_store()
+        state = session.get("game_state")
+        game_id = session.get("game_id")
+        if store is not None and game_id and state is None:
+            state = store.get(game_id)
+        if state is None and current_user.is_authenticated:
+            state = get_checkpoints(current_app.config).get(current_user.id)
+            if state is not None:
+                _write_state(state)
+        request_state.game_state = state
+    return request_state.game_state
+
+
+def has_game() -> bool:
+    """Session hiện tại có game đang chơi không."""
+    return _stored_state() is not None
+
+
 def load_game() -> Game2048:
-    """Load game state from session."""
-    g = Game2048()
-    state = session.get("game_state")
-    if state:
-        g.__dict__.update(state)
-        # đảm bảo grid không bị mất
-        g.grid = state.get("grid", g.grid)
+    """Load game state from session / game store."""
+    history_size = current_app.config["UNDO_HISTORY_SIZE"]
+    state = _stored_state()
+    if isinstance(state, bytes):
+        try:
+            return decode_game(state, history_size=history_size)
+        except ValueError:
+            pass
+    g = BitboardGame2048(history_size=history_size)
+    if isinstance(state, dict):
+        # Session cũ lưu dạng dict (trước khi có binary codec)
+        for key in Game2048.__slots__:
+            if key in state:
+                setattr(g, key, state[key])
     return g
 
 
+def _write_state(data):
+    """
+    Ghi bytes game vào cookie hoặc game store. Backend cookie không ghi cookie
+    quá 4 KB: game có move log quá dài được chuyển sang bảng game_states.
+    """
+    store = get_store(current_app.config)
+    if store is None and not _fits_cookie(data):
+        store = get_overflow_store(current_app.config)
+    if store is None:
+        session["game_state"] = data
+        # Ván mới vừa cookie trở lại: bỏ bản trong game_states
+        game_id = session.pop("game_id", None)
+        if game_id:
+            get_overflow_store(current_app.config).delete(game_id)
+    else:
+        game_id = session.get("game_id")
+        if not game_id:
+            game_id = session["game_id"] = uuid.uuid4().hex
+        store.set(game_id, data)
+        # Game cũ nằm trong cookie được chuyển sang store
+        session.pop("game_state", None)
+    request_state.game_state = data
+
+
 def save_game(g: Game2048):
-    """Save game state to session."""
-    session["game_state"] = g.__dict__.copy()
-    session["game_state"]["grid"] = g.grid
+    """Save game state to session / game store (bỏ qua nếu không thay đổi)."""
+    data = encode_game(g)
+    if data == _stored_state():
+        return
+    _write_state(data)
+    if current_user.is_authenticated:
+        # Checkpoint write-behind: không chạm DB ở đây
+        get_checkpoints(current_app.config).record(current_user.id, data, g.moves)
+
+
+def new_game():
+    """Tạo và lưu ván mới; seed được ghi nhận cho user hiện tại. Trả về (game, kết quả setup)."""
+    g = BitboardGame2048(history_size=current_app.config["UNDO_HISTORY_SIZE"])
+    result = g.setup()
+    if current_user.is_authenticated:
+        issue_game(current_user.id, g.seed)
+    save_game(g)
+    return g, result
+
+
+def clear_game(game_over=False):
+    """
+    Xoá game hiện tại khỏi session (game over, đăng xuất).
+    game_over=True xoá cả checkpoint để không chơi tiếp ván đã kết thúc.
+    """
+    store = _game_store()
+    game_id = session.pop("game_id", None)
+    if store is not None and game_id:
+        store.delete(game_id)
+    session.pop("game_state", None)
+    request_state.game_state = None
+    if game_over and current_user.is_authenticated:
+        get_checkpoints(current_app.config).discard(current_user.id)
@@ -0,0 +1,228 @@
+"""
+Bảng heuristic tính sẵn cho từng hàng 16-bit (4 ô, số mũ 4 bit mỗi ô).
+
+Mỗi thành phần (số ô trống, khả năng gộp, độ đơn điệu, độ mượt, tổng giá
+trị) và điểm tổng hợp được tính một lần cho cả 65.536 hàng, nên đánh giá
+một bàn cờ chỉ còn 8 lần tra bảng (4 hàng + 4 cột).
+
+Bảng được sinh tất định từ trọng số bên dưới, ghi ra file (ghi tạm rồi
+os.replace) và nạp bằng mmap - các worker gunicorn trên cùng máy dùng
+chung một bản trong page cache. File sai phiên bản/trọng số được sinh lại.
+"""
+
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+
+from bitboard import ROW_MASK, SIZE, pack_grid, transpose
+
+# Trọng số heuristic
+LOST_PENALTY = 200000.0
+EMPTY_WEIGHT = 270.0
+MERGES_WEIGHT = 700.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SMOOTHNESS_WEIGHT = 10.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+
+TABLE_VERSION = 1
+ROWS = 1 << 16
+FEATURES = ("score", "empty", "merges", "monotonicity", "smoothness", "sum")
+
+# magic, phiên bản, fingerprint trọng số, số bảng
+_HEADER = struct.Struct("<8sI16sI")
+_MAGIC = b"H2048ROW"
+
+_tables = None
+_score_table = None
+_lock = threading.Lock()
+
+
+def _fingerprint():
+    """Hash của trọng số + thứ tự bảng - đổi trọng số thì file cũ bị bỏ."""
+    weights = (
+        LOST_PENALTY, EMPTY_WEIGHT, MERGES_WEIGHT, MONOTONICITY_POWER,
+        MONOTONICITY_WEIGHT, SMOOTHNESS_WEIGHT, SUM_POWER, SUM_WEIGHT, FEATURES,
+    )
+    return hashlib.blake2b(repr(weights).encode(), digest_size=16).digest()
+
+
+def default_path():
+    """Đường dẫn file bảng: HEURISTIC_TABLES_PATH hoặc thư mục tạm của hệ thống."""
+    return os.getenv("HEURISTIC_TABLES_PATH") or os.path.join(
+        tempfile.gettempdir(), f"game2048-heuristics-v{TABLE_VERSION}-{_fingerprint().hex()[:8]}.bin"
+    )
+
+
+def row_features(row):
+    """Các thành phần heuristic của một hàng 16-bit (tính trực tiếp, không tra bảng)."""
+    exps = [(row >> (4 * c)) & 0xF for c in range(SIZE)]
+
+    empty = 0
+    merges = 0
+    prev = 0
+    counter = 0
+    total = 0.0
+    for e in exps:
+        total += e ** SUM_POWER
+        if e == 0:
+            empty += 1
+        else:
+            if prev == e:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            prev = e
+    if counter > 0:
+        merges += 1 + counter
+
+    mono_left = 0.0
+    mono_right = 0.0
+    smoothness = 0
+    for i in range(1, SIZE):
+        a = exps[i - 1]
+        b = exps[i]
+        if a > b:
+            mono_left += a ** MONOTONICITY_POWER - b ** MONOTONICITY_POWER
+        else:
+            mono_right += b ** MONOTONICITY_POWER - a ** MONOTONICITY_POWER
+        if a and b:
+            smoothness += abs(a - b)
+
+    monotonicity = min(mono_left, mono_right)
+    score = (
+        LOST_PENALTY
+        + EMPTY_WEIGHT * empty
+        + MERGES_WEIGHT * merges
+        - MONOTONICITY_WEIGHT * monotonicity
+        - SMOOTHNESS_WEIGHT * smoothness
+        - SUM_WEIGHT * total
+    )
+    return score, empty, merges, monotonicity, smoothness, total
+
+
+def row_heuristic(row):
+    """Điểm heuristic của một hàng 16-bit."""
+    return row_features(row)[0]
+
+
+def build_tables():
+    """Sinh toàn bộ bảng (tất định). Trả về list array('d') theo thứ tự FEATURES."""
+    tables = [array.array("d", bytes(8 * ROWS)) for _ in FEATURES]
+    for row in range(ROWS):
+        for table, value in zip(tables, row_features(row)):
+            table[row] = value
+    return tables
+
+
+def write_tables(path, tables=None):
+    """Ghi bảng ra file (ghi file tạm cùng thư mục rồi os.replace)."""
+    tables = tables or build_tables()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".heuristics-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, TABLE_VERSION, _fingerprint(), len(tables)))
+            for table in tables:
+                if sys.byteorder != "little":
+                    table = array.array("d", table)
+                    table.byteswap()
+                f.write(table.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _map_tables(path):
+    """mmap file bảng. Trả về tuple memoryview('d') hoặc None nếu file không hợp lệ."""
+    expected = _HEADER.size + len(FEATURES) * 8 * ROWS
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size != expected:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    magic, version, fingerprint, count = _HEADER.unpack_from(mapped, 0)
+    if (magic, version, fingerprint, count) != (_MAGIC, TABLE_VERSION, _fingerprint(), len(FEATURES)):
+        mapped.close()
+        return None
+    if sys.byteorder != "little":
+        mapped.close()
+        return None
+
+    view = memoryview(mapped)
+    size = 8 * ROWS
+    return tuple(
+        view[_HEADER.size + i * size:_HEADER.size + (i + 1) * size].cast("d")
+        for i in range(len(FEATURES))
+    )
+
+
+def load_tables(path=None):
+    """
+    Nạp bảng (mmap, dùng chung giữa các process). Sinh và ghi file nếu chưa có
+    hoặc không hợp lệ; nếu không ghi được thì dùng bảng trong bộ nhớ.
+    Trả về dict {tên thành phần: bảng 65.536 phần tử}.
+    """
+    global _tables, _score_table
+    if _tables is not None and path is None:
+        return _tables
+
+    with _lock:
+        if _tables is not None and path is None:
+            return _tables
+
+        path = path or default_path()
+        tables = _map_tables(path)
+        if tables is None:
+            built = build_tables()
+            try:
+                write_tables(path, built)
+                tables = _map_tables(path)
+            except OSError:
+                tables = None
+            tables = tables or built
+        _tables = dict(zip(FEATURES, tables))
+        _score_table = _tables["score"]
+        return _tables
+
+
+def get_score_table():
+    """Bảng điểm tổng hợp theo hàng."""
+    return load_tables()["score"]
+
+
+def evaluate(board):
+    """Đánh giá bàn cờ 64-bit: tổng điểm của 4 hàng và 4 cột (8 lần tra bảng)."""
+    table = _score_table or get_score_table()
+    cols = transpose(board)
+    return (
+        table[board & ROW_MASK] + table[(board >> 16) & ROW_MASK]
+        + table[(board >> 32) & ROW_MASK] + table[board >> 48]
+        + table[cols & ROW_MASK] + table[(cols >> 16) & ROW_MASK]
+        + table[(cols >> 32) & ROW_MASK] + table[cols >> 48]
+    )
+
+
+def board_features(board):
+    """Tổng từng thành phần heuristic trên 4 hàng và 4 cột của bàn cờ 64-bit."""
+    tables = load_tables()
+    cols = transpose(board)
+    lines = [(board >> (16 * i)) & ROW_MASK for i in range(SIZE)]
+    lines += [(cols >> (16 * i)) & ROW_MASK for i in range(SIZE)]
+    return {name: sum(table[line] for line in lines) for name, table in tables.items()}
+
+
+def evaluate_grid(grid):
+    """Đánh giá Game2048.grid (4x4). Raise ValueError nếu có ô lớn hơn 32768."""
+    return evaluate(pack_grid(grid))
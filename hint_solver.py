@@ -0,0 +1,511 @@
+"""
+Expectimax hint solver cho tính năng gợi ý (premium).
+
+Tìm kiếm xen kẽ nút MAX (người chơi chọn hướng) và nút CHANCE (ô mới 2/4
+xuất hiện ở một ô trống), đánh giá lá bằng bảng heuristic tính sẵn theo hàng/cột (heuristics.py):
+độ đơn điệu, số ô trống, độ mượt và khả năng gộp.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from bitboard import DIRECTIONS, MASK_CELLS, ROW_MASK, SIZE, get_tables, move_board
+from heuristics import evaluate, load_tables
+
+# Bỏ qua nhánh có xác suất xuất hiện quá nhỏ
+CPROB_THRESHOLD = 0.0001
+
+# Thời gian (giây) dành cho process con trả kết quả trước deadline của parallel_search
+SEARCH_MARGIN = 0.02
+
+# Thời gian (giây) tối đa một process con chờ các process con khác khởi động xong
+POOL_START_TIMEOUT = 30
+
+_shared_table = None
+_pool = None
+_pool_lock = threading.Lock()
+_pool_warmup = ()
+_precomputer = None
+
+
+class SearchTimeout(Exception):
+    """Hết thời gian tìm kiếm (deadline)."""
+
+
+class TranspositionTable:
+    """
+    Bộ nhớ đệm LRU cho giá trị nút CHANCE, khoá = (bàn cờ 64-bit, độ sâu còn lại)
+    nén thành một số nguyên (độ sâu nằm trên 64 bit của bàn cờ nên không giới
+    hạn độ sâu). Giới hạn theo số phần tử, mỗi phần tử ~150 byte.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(board, depth):
+        """Khoá nén: độ sâu << 64 | bàn cờ 64-bit."""
+        return (depth << 64) | board
+
+    def get(self, key):
+        """Trả về giá trị đã lưu hoặc None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Lưu giá trị, loại phần tử ít dùng nhất khi vượt giới hạn."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Xoá toàn bộ phần tử và bộ đếm."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Bộ đếm hit/miss/eviction để định cỡ bộ nhớ đệm."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def get_shared_table(max_entries=100000):
+    """Transposition table dùng chung trong process (giữa các request)."""
+    global _shared_table
+    if _shared_table is None:
+        _shared_table = TranspositionTable(max_entries)
+    return _shared_table
+
+
+class ExpectimaxSolver:
+    """Tìm nước đi tốt nhất bằng expectimax với giới hạn độ sâu, số nút và thời gian."""
+
+    def __init__(self, depth=3, node_budget=50000, table=None):
+        self.depth = max(1, depth)
+        self.node_budget = node_budget
+        self.table = table
+        self.nodes = 0
+        self._limit = node_budget
+        self._deadline = None
+
+    def search(self, board):
+        """
+        Trả về {"direction", "scores", "depth", "nodes"} cho bàn cờ 64-bit,
+        hoặc None nếu không còn nước đi. scores[hướng] là giá trị kỳ vọng
+        (None nếu hướng đó không làm thay đổi bàn cờ).
+        Raise SearchTimeout nếu vượt deadline đã đặt.
+        """
+        self.nodes = 0
+        children = root_children(board)
+        if not children:
+            return None
+
+        # Chia đều ngân sách nút cho các hướng hợp lệ để hướng sau không bị thiệt
+        share = self.node_budget // len(children)
+        values = {}
+        for direction, moved in children:
+            values[direction] = self.evaluate_child(moved, self.depth, share)
+        return _hint_result(values, self.depth, self.nodes)
+
+    def iterative_search(self, board, time_limit):
+        """
+        Iterative deepening từ độ sâu 1 tới self.depth trong time_limit giây.
+        Trả về kết quả của độ sâu sâu nhất đã hoàn thành (độ sâu 1 luôn hoàn thành).
+        """
+        max_depth = self.depth
+        deadline = time.perf_counter() + time_limit
+        best = None
+        total_nodes = 0
+        try:
+            for depth in range(1, max_depth + 1):
+                self.depth = depth
+                # Độ sâu 1 chỉ là 4 lần đánh giá - không áp deadline để luôn có kết quả
+                self._deadline = deadline if depth > 1 else None
+                result = self.search(board)
+                total_nodes += self.nodes
+                if result is None:
+                    return None
+                best = result
+                if time.perf_counter() >= deadline:
+                    break
+        except SearchTimeout:
+            total_nodes += self.nodes
+        finally:
+            self.depth = max_depth
+            self._deadline = None
+
+        best["nodes"] = total_nodes
+        return best
+
+    def evaluate_child(self, moved, depth, share):
+        """Giá trị kỳ vọng của bàn cờ sau nước đi gốc, tìm tới độ sâu depth."""
+        self._limit = self.nodes + share
+        return self._chance_node(moved, depth - 1, 1.0)
+
+    def _max_node(self, board, depth, cprob):
+        """Nút người chơi: chọn hướng có giá trị kỳ vọng cao nhất."""
+        self.nodes += 1
+        best = 0.0
+        for direction in DIRECTIONS:
+            moved = move_board(board, direction)
+            if moved != board:
+                value = self._chance_node(moved, depth - 1, cprob)
+                if value > best:
+                    best = value
+        return best
+
+    def _chance_node(self, board, depth, cprob):
+        """Nút ngẫu nhiên: trung bình theo ô trống, 90% ra 2 và 10% ra 4."""
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes & 0xFF and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+        if depth <= 0 or cprob < CPROB_THRESHOLD or self.nodes >= self._limit:
+            return evaluate(board)
+
+        table = self.table
+        if table is not None:
+            key = (depth << 64) | board
+            cached = table.get(key)
+            if cached is not None:
+                return cached
+
+        empty_mask = get_tables()["empty_mask"]
+        cells = [
+            4 * (SIZE * r + c)
+            for r in range(SIZE)
+            for c in MASK_CELLS[empty_mask[(board >> (16 * r)) & ROW_MASK]]
+        ]
+        if not cells:
+            return evaluate(board)
+
+        cprob /= len(cells)
+        total = 0.0
+        for shift in cells:
+            total += 0.9 * self._max_node(board | (1 << shift), depth, cprob * 0.9)
+            total += 0.1 * self._max_node(board | (2 << shift), depth, cprob * 0.1)
+        value = total / len(cells)
+
+        # Chỉ lưu khi nhánh được duyệt đầy đủ (chưa chạm ngân sách nút)
+        if table is not None and self.nodes < self._limit:
+            table.put(key, value)
+        return value
+
+
+def root_children(board):
+    """Danh sách (hướng, bàn cờ sau nước đi) cho các hướng hợp lệ."""
+    children = []
+    for direction in DIRECTIONS:
+        moved = move_board(board, direction)
+        if moved != board:
+            children.append((direction, moved))
+    return children
+
+
+def _hint_result(values, depth, nodes):
+    """Gói kết quả gợi ý từ giá trị kỳ vọng của từng hướng."""
+    scores = dict.fromkeys(DIRECTIONS)
+    for direction, value in values.items():
+        scores[direction] = round(value, 2)
+    best_direction = max(values, key=values.get)
+    return {"direction": best_direction, "scores": scores, "depth": depth, "nodes": nodes}
+
+
+def _search_child(moved, max_depth, node_budget, deadline, time_slice, max_entries):
+    """
+    Chạy trong process con: iterative deepening cho một hướng gốc tới
+    min(deadline, lúc bắt đầu chạy + time_slice) (time_slice None: tới deadline).
+    deadline là thời điểm tuyệt đối (time.time(), dùng chung giữa các process)
+    nên thời gian chờ trong hàng đợi của pool cũng được tính. node_budget là
+    ngân sách của riêng hướng này. Trả về ({độ sâu: giá trị}, số nút).
+    """
+    solver = ExpectimaxSolver(max_depth, node_budget, get_shared_table(max_entries))
+    # Đổi sang đồng hồ perf_counter của process này để solver kiểm tra
+    remaining = deadline - time.time()
+    if time_slice is not None:
+        remaining = min(remaining, time_slice)
+    local_deadline = time.perf_counter() + remaining
+    values = {}
+    nodes = 0
+    try:
+        for depth in range(1, max_depth + 1):
+            solver._deadline = local_deadline if depth > 1 else None
+            solver.nodes = 0
+            values[depth] = solver.evaluate_child(moved, depth, node_budget)
+            nodes += solver.nodes
+            if time.perf_counter() >= local_deadline:
+                break
+    except SearchTimeout:
+        nodes += solver.nodes
+    return values, nodes
+
+
+def _init_worker(barrier=None):
+    """
+    Khởi tạo process con: nạp bảng heuristic và bảng nước đi theo hàng (mmap),
+    rồi chờ các process con còn lại để cả pool sẵn sàng cùng lúc.
+    """
+    load_tables()
+    get_tables()
+    if barrier is not None:
+        try:
+            barrier.wait(POOL_START_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+
+
+def get_pool(size):
+    """
+    Process pool dùng chung trong process, tạo khi cần. Dùng forkserver/spawn
+    thay vì fork: server nhiều thread có thể fork đúng lúc một lock đang bị giữ.
+    Gọi lúc app khởi động (app.py) để process con khởi động trước request đầu tiên.
+    """
+    global _pool, _pool_warmup
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                pool = ProcessPoolExecutor(
+                    max_workers=size, mp_context=context,
+                    initializer=_init_worker, initargs=(context.Barrier(size),)
+                )
+                # Khởi động sẵn các process con (không chờ) - xem pool_ready()
+                _pool_warmup = [pool.submit(time.sleep, 0) for _ in range(size)]
+                _pool = pool
+    return _pool
+
+
+def pool_ready():
+    """Mọi process con của pool đã khởi động xong và chạy được chưa (không chờ)."""
+    return _pool is not None and all(future.done() and not future.exception() for future in _pool_warmup)
+
+
+def parallel_search(board, depth, node_budget, time_limit, pool_size, max_entries=100000):
+    """
+    Chia 4 hướng gốc cho process pool với một deadline chung (tính cả thời
+    gian chờ trong pool). Mỗi hướng được ngân sách nút như khi tìm tuần tự
+    (node_budget chia đều theo số hướng) nên mỗi độ sâu tốn đúng như nhau; khi
+    pool đủ process cho mọi hướng, mỗi hướng chạy tới deadline, ngược lại được
+    một phần thời gian bằng nhau theo số lượt chạy của pool. Khi hết giờ, so
+    sánh các hướng ở độ sâu lớn nhất mà tất cả đều hoàn thành.
+    """
+    children = root_children(board)
+    if not children:
+        return None
+
+    deadline = time.time() + time_limit
+    # Process con dừng sớm hơn deadline một chút để kịp trả kết quả về
+    margin = min(SEARCH_MARGIN, time_limit / 4)
+    rounds = -(-len(children) // pool_size)
+    time_slice = (time_limit - margin) / rounds if rounds > 1 else None
+    share = node_budget // len(children)
+    pool = get_pool(pool_size)
+    futures = {
+        pool.submit(_search_child, moved, depth, share, deadline - margin, time_slice, max_entries): direction
+        for direction, moved in children
+    }
+
+    done, not_done = wait(futures, timeout=max(0.0, deadline - time.time()))
+    for future in not_done:
+        future.cancel()
+
+    per_direction = {}
+    nodes = 0
+    for future in done:
+        try:
+            values, child_nodes = future.result()
+        except Exception:
+            continue
+        if values:
+            per_direction[futures[future]] = values
+            nodes += child_nodes
+
+    reached = max(set.intersection(*(set(values) for values in per_direction.values())), default=0) \
+        if per_direction else 0
+    if not reached:
+        # Không hướng nào xong kịp (process con lỗi) - tìm tuần tự ở độ sâu 1
+        return ExpectimaxSolver(1, node_budget).search(board)
+
+    values = {direction: per_direction[direction][reached] for direction in per_direction}
+    return _hint_result(values, reached, nodes)
+
+
+def find_hint(board, depth=3, node_budget=50000, table=None, deadline_ms=None, pool_size=0):
+    """
+    Điểm vào của hint engine.
+    - pool_size > 1, có deadline, máy nhiều CPU và pool đã khởi động xong:
+      chia hướng gốc cho process pool
+    - có deadline: iterative deepening tuần tự
+    - còn lại: tìm cố định ở độ sâu depth
+    """
+    # Nạp bảng heuristic trước khi tính deadline (lần đầu có thể phải sinh bảng)
+    load_tables()
+    if deadline_ms and pool_size > 1 and (os.cpu_count() or 1) > 1:
+        get_pool(pool_size)
+        if pool_ready():
+            max_entries = table.max_entries if table is not None else 100000
+            return parallel_search(board, depth, node_budget, deadline_ms / 1000.0, pool_size, max_entries)
+        # Pool đang khởi động: tìm tuần tự thay vì chờ
+    solver = ExpectimaxSolver(depth, node_budget, table)
+    if deadline_ms:
+        return solver.iterative_search(board, deadline_ms / 1000.0)
+    return solver.search(board)
+
+
+class HintPrecomputer:
+    """
+    Tính trước gợi ý cho bàn cờ vừa được lưu (speculative), kết quả lưu LRU theo
+    bàn cờ 64-bit. Thread pool có giới hạn: khi đã có max_pending việc đang chờ
+    thì bỏ qua yêu cầu mới (backpressure) thay vì xếp hàng.
+    """
+
+    def __init__(self, workers=1, max_pending=4, max_entries=10000):
+        self.max_entries = max_entries
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._pending = {}
+        self._latest = {}
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hint-speculate")
+
+    def submit(self, board, owner=None, **options):
+        """
+        Xếp việc tính gợi ý cho board. Trả về False nếu bị bỏ qua.
+        owner (vd. user id): việc cũ của cùng owner chưa chạy sẽ bị huỷ.
+        """
+        stale = None
+        if owner is not None:
+            with self._lock:
+                previous = self._latest.pop(owner, None)
+                if previous != board:
+                    stale = self._pending.get(previous)
+        # cancel() gọi done-callback (_release) ngay trong thread này - không giữ self._lock
+        if stale is not None and stale.cancel():
+            with self._lock:
+                self.cancelled += 1
+
+        with self._lock:
+            if board in self._results or board in self._pending:
+                return False
+            if owner is not None:
+                self._latest[owner] = board
+            if not self._slots.acquire(blocking=False):
+                self.dropped += 1
+                return False
+            self.submitted += 1
+            future = self._pending[board] = self._executor.submit(self._run, board, options)
+        future.add_done_callback(lambda _: self._release(board))
+        return True
+
+    def _run(self, board, options):
+        """Chạy trong thread nền: tính gợi ý và lưu kết quả."""
+        try:
+            result = find_hint(board, **options)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        self.put(board, result)
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def _release(self, board):
+        """Việc xong hoặc bị huỷ: trả slot cho pool."""
+        with self._lock:
+            self._pending.pop(board, None)
+        self._slots.release()
+
+    def get(self, board, timeout=None):
+        """
+        Kết quả đã tính cho board, hoặc None. Nếu board đang được tính thì chờ
+        tối đa timeout giây; nếu còn nằm trong hàng đợi thì huỷ để request tự tính.
+        """
+        with self._lock:
+            result = self._results.get(board)
+            if result is not None:
+                self._results.move_to_end(board)
+                self.hits += 1
+                return result
+            future = self._pending.get(board)
+
+        result = None
+        if future is not None and not future.cancel():
+            try:
+                result = future.result(timeout=timeout)
+            except Exception:
+                # FutureTimeout hoặc lỗi trong thread nền
+                result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.waits += 1
+        return result
+
+    def put(self, board, result):
+        """Lưu kết quả (cả kết quả tính đồng bộ ở request) cho board."""
+        with self._lock:
+            self._results[board] = result
+            self._results.move_to_end(board)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def stats(self):
+        """Bộ đếm speculation: hit = gợi ý đọc từ kết quả tính trước."""
+        lookups = self.hits + self.waits + self.misses
+        return {
+            "size": len(self._results),
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "hits": self.hits,
+            "waits": self.waits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.waits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def get_precomputer(workers=1, max_pending=4, max_entries=10000):
+    """HintPrecomputer dùng chung trong process, tạo khi cần."""
+    global _precomputer
+    if _precomputer is None:
+        _precomputer = HintPrecomputer(workers, max_pending, max_entries)
+    return _precomputer
@@ -3,26 +3,21 @@ import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app import db, app, User, Score, Order, PremiumPlan
+from app import db, app
+from models import PremiumPlan
+from schema_migrations import run_migrations
 
 load_dotenv()
 
 def migrate():
     """Chạy migration để tạo tất cả các bảng."""
     with app.app_context():
-        print("Creating database tables...")
-        
-        # Drop all tables (chú ý: xóa dữ liệu cũ)
-        db.drop_all()
-        
-        # Create all tables
-        db.create_all()
-        
-        print("Created table: users")
-        print("Created table: scores")
-        print("Created table: premium_plans")
-        print("Created table: orders")
-        
+        print("Running schema migrations...")
+
+        # Migration có phiên bản: chỉ tạo bảng/index còn thiếu, không xoá dữ liệu cũ
+        applied = run_migrations(db.engine)
+        print(f"Applied migrations: {applied or 'none'}")
+
         # Seed premium plans
         plans = [
             PremiumPlan(
@@ -48,8 +43,11 @@ def migrate():
             )
         ]
         
+        # Chỉ thêm gói chưa có (chạy lại nhiều lần không tạo trùng)
+        existing = {name for (name,) in db.session.query(PremiumPlan.name)}
         for plan in plans:
-            db.session.add(plan)
+            if plan.name not in existing:
+                db.session.add(plan)
         
         db.session.commit()
         print("Seeded premium plans")
@@ -58,7 +56,7 @@ def migrate():
         print("\nTo run migration on MySQL, ensure:")
         print("1. SQLALCHEMY_DATABASE_URI configured in .env")
         print("2. Database created")
-        print("3. User has CREATE TABLE permission")
+        print("3. User has CREATE TABLE / CREATE INDEX permission")
 
 if __name__ == "__main__":
     migrate()
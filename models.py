@@ -49,6 +49,12 @@ class Score(db.Model):
     max_tile = db.Column(db.Integer, nullable=False)
     moves = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Database đã có: index được thêm bởi schema_migrations (migration 2)
+    __table_args__ = (
+        db.Index("ix_scores_user_history", user_id, created_at, id),
+        db.Index("ix_scores_user_score", user_id, score),
+        db.Index("ix_scores_rank", score, max_tile, moves),
+    )
 
 
 class PremiumPlan(db.Model):
@@ -72,3 +78,88 @@ class Order(db.Model):
     transaction_id = db.Column(db.String(100), unique=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     completed_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index("ix_orders_user_created", user_id, created_at),
+    )
+
+
+class GameState(db.Model):
+    """Trạng thái game lưu phía server (GAME_STORE=sql), khoá = game id trong session."""
+    __tablename__ = "game_states"
+    id = db.Column(db.String(32), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class SavedGame(db.Model):
+    """
+    Checkpoint ván đang chơi của user (chơi tiếp trên thiết bị khác), xem checkpoint.py.
+    data rỗng là dấu xoá (game over); version là thời điểm trạng thái được ghi nhận (ns).
+    """
+    __tablename__ = "saved_games"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    moves = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class IssuedGame(db.Model):
+    """Seed của ván đã phát cho user, chưa ghi điểm - mỗi seed chỉ được ghi điểm một lần (scoring.claim_game)."""
+    __tablename__ = "issued_games"
+    seed = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    issued_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class UserBest(db.Model):
+    """Điểm cao nhất của mỗi user (bảng tổng hợp cho leaderboard), cập nhật trong scoring.record_score()."""
+    __tablename__ = "user_best"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    score_id = db.Column(db.Integer, db.ForeignKey("scores.id", ondelete="SET NULL"), nullable=True)
+    score = db.Column(db.Integer, nullable=False)
+    max_tile = db.Column(db.Integer, nullable=False)
+    moves = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index("ix_user_best_rank", score.desc(), max_tile.desc(), moves, created_at),
+    )
+
+
+class UserBestPeriod(db.Model):
+    """Điểm cao nhất của mỗi user trong từng ngày/tuần (leaderboard theo thời gian)."""
+    __tablename__ = "user_best_period"
+    period = db.Column(db.String(8), primary_key=True)  # "day" | "week"
+    bucket_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    score_id = db.Column(db.Integer, db.ForeignKey("scores.id", ondelete="SET NULL"), nullable=True)
+    score = db.Column(db.Integer, nullable=False)
+    max_tile = db.Column(db.Integer, nullable=False)
+    moves = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index("ix_user_best_period_rank", period, bucket_start, score.desc(), max_tile.desc(), moves, created_at),
+    )
+
+
+class UserStats(db.Model):
+    """Thống kê cộng dồn của mỗi user (trang lịch sử), cập nhật trong scoring.record_score()."""
+    __tablename__ = "user_stats"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_games = db.Column(db.Integer, nullable=False, default=0)
+    total_score = db.Column(db.BigInteger, nullable=False, default=0)
+    total_moves = db.Column(db.BigInteger, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    best_tile = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def as_dict(self):
+        """Dạng dict cho template game_history.html."""
+        games = self.total_games or 0
+        return {
+            "total_games": games,
+            "best_score": self.best_score or 0,
+            "best_tile": self.best_tile or 0,
+            "avg_score": round(self.total_score / games, 1) if games else 0.0,
+            "total_moves": self.total_moves or 0,
+        }
@@ -0,0 +1,203 @@
+"""
+Thứ hạng toàn cục theo điểm cao nhất của mỗi user, không truy vấn database.
+
+Histogram điểm chia bucket cố định (mặc định rộng 4 - mọi điểm 2048 đều là
+bội của 4 nên mỗi bucket là đúng một mức điểm) lưu trong cây Fenwick: đếm số
+user có điểm cao hơn một mức bất kỳ trong O(log n). Dựng từ bảng user_best
+trong thread nền (khởi động cùng app, xem app.py) - tới khi xong thì lookup()
+trả None để /api/rank báo "đang khởi động" thay vì bắt request chờ. Cập nhật
+khi có ván mới được ghi (score_ingest) và dựng lại định kỳ để nhận điểm do các
+worker khác ghi.
+
+Các user cùng điểm có cùng thứ hạng (không xét max_tile / moves như leaderboard).
+"""
+
+import array
+import threading
+import time
+
+from sqlalchemy import select
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class ScoreHistogram:
+    """Cây Fenwick đếm số user theo bucket điểm, kèm điểm cao nhất của từng user."""
+
+    def __init__(self, max_score=1000000, bucket_width=4):
+        self.bucket_width = bucket_width
+        self.size = max_score // bucket_width + 1
+        self._tree = array.array("i", bytes(4 * (self.size + 1)))
+        self._best = {}
+
+    @classmethod
+    def build(cls, rows, max_score=1000000, bucket_width=4):
+        """Dựng từ các cặp (user_id, điểm cao nhất) trong O(n + số bucket)."""
+        histogram = cls(max_score, bucket_width)
+        tree = histogram._tree
+        for user_id, score in rows:
+            histogram._best[user_id] = score
+            tree[histogram._bucket(score) + 1] += 1
+        for i in range(1, histogram.size + 1):
+            parent = i + (i & -i)
+            if parent <= histogram.size:
+                tree[parent] += tree[i]
+        return histogram
+
+    def _bucket(self, score):
+        return min(max(score, 0) // self.bucket_width, self.size - 1)
+
+    def _add(self, bucket, delta):
+        i = bucket + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_upto(self, bucket):
+        """Số user có điểm thuộc bucket <= `bucket`."""
+        i = bucket + 1
+        count = 0
+        while i > 0:
+            count += self._tree[i]
+            i -= i & -i
+        return count
+
+    def update(self, user_id, score):
+        """Ghi nhận điểm mới của user (chỉ đổi nếu cao hơn điểm đang có)."""
+        old = self._best.get(user_id)
+        if old is not None and score <= old:
+            return False
+        if old is not None:
+            self._add(self._bucket(old), -1)
+        self._add(self._bucket(score), 1)
+        self._best[user_id] = score
+        return True
+
+    def best(self, user_id):
+        return self._best.get(user_id)
+
+    def total(self):
+        return len(self._best)
+
+    def rank(self, score):
+        """Thứ hạng của một mức điểm: 1 + số user có điểm cao hơn."""
+        return len(self._best) - self._count_upto(self._bucket(score)) + 1
+
+
+class RankIndex:
+    """
+    Histogram dùng chung trong process, dựng lần đầu và dựng lại từ user_best
+    mỗi `refresh_interval` giây trong thread nền.
+    """
+
+    # Thời gian (giây) chờ trước khi thử dựng lại lần đầu sau lỗi (vd. chưa migrate)
+    RETRY_INTERVAL = 5.0
+
+    def __init__(self, engine, table, max_score=1000000, refresh_interval=300.0):
+        self.engine = engine
+        self.table = table
+        self.max_score = max_score
+        self.refresh_interval = refresh_interval
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+        # Điểm ghi nhận trước khi dựng xong được áp lại sau khi dựng
+        self._replay = []
+        self._histogram = None
+        self._thread = threading.Thread(target=self._run, name="rank-refresh", daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(self.table.c.user_id, self.table.c.score)).all()
+        self.rebuilds += 1
+        return ScoreHistogram.build(rows, self.max_score)
+
+    def ready(self):
+        """Histogram đã được dựng lần đầu chưa."""
+        return self._histogram is not None
+
+    def refresh(self):
+        """Dựng lại histogram; điểm ghi nhận trong lúc dựng được áp lại sau khi đổi."""
+        with self._lock:
+            if self._histogram is not None:
+                self._replay = []
+        try:
+            histogram = self._load()
+        except Exception:
+            with self._lock:
+                if self._histogram is not None:
+                    self._replay = None
+            raise
+        with self._lock:
+            for user_id, score in self._replay:
+                histogram.update(user_id, score)
+            self._histogram = histogram
+            self._replay = None
+
+    def _run(self):
+        """Thread nền: dựng lần đầu (thử lại tới khi được) rồi dựng lại định kỳ."""
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f">>> Rank index refresh error: {e}")
+            time.sleep(self.refresh_interval if self.ready() else self.RETRY_INTERVAL)
+
+    def observe(self, records):
+        """Cập nhật theo các ván vừa ghi (dict có user_id, score)."""
+        with self._lock:
+            for record in records:
+                if self._histogram is not None:
+                    self._histogram.update(record["user_id"], record["score"])
+                if self._replay is not None:
+                    self._replay.append((record["user_id"], record["score"]))
+
+    def lookup(self, user_id=None, score=None):
+        """
+        Thứ hạng của user (theo điểm cao nhất) hoặc của một mức điểm bất kỳ.
+        Trả về dict score, rank, total, top_percent, percentile (rank None nếu user chưa có điểm),
+        hoặc None nếu histogram chưa dựng xong.
+        """
+        with self._lock:
+            histogram = self._histogram
+            if histogram is None:
+                return None
+            total = histogram.total()
+            if score is None:
+                score = histogram.best(user_id)
+                if score is None:
+                    return {"score": None, "rank": None, "total": total, "top_percent": None, "percentile": None}
+                population = total
+            else:
+                # Mức điểm giả định được tính như thêm một người chơi
+                population = total + 1
+            rank = histogram.rank(score)
+        return {
+            "score": score,
+            "rank": rank,
+            "total": population,
+            "top_percent": round(100.0 * rank / population, 2),
+            "percentile": round(100.0 * (population - rank) / population, 2),
+        }
+
+
+def get_rank_index(config):
+    """RankIndex dùng chung trong process (tạo trong app context, dựng trong thread nền)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from config import db
+                from models import UserBest
+
+                _index = RankIndex(
+                    db.engine, UserBest.__table__, config["RANK_MAX_SCORE"], config["RANK_REFRESH_SEC"]
+                )
+    return _index
+
+
+def observe_scores(records):
+    """Báo các ván vừa ghi cho RankIndex nếu đã được dựng (không dựng mới)."""
+    if _index is not None:
+        _index.observe(records)
@@ -0,0 +1,117 @@
+"""
+Replay và xác minh điểm phía server.
+
+Một ván được xác định hoàn toàn bởi (seed, move log): replay chạy lại log
+trên bitboard với cùng RNG tất định rồi so sánh score/max_tile/moves được
+gửi lên. Ván có ô lớn hơn 32768 được chơi lại bằng BitboardGame2048.
+"""
+
+from bitboard import (
+    BitboardGame2048, SHUFFLE_TOKEN, SWAP_TOKEN, TOKEN_MOVES,
+    add_random_tile, board_stats, log_tokens, max_tile, move_and_score,
+    pack_grid, tile_rng, unpack_board,
+)
+
+
+class ReplayError(ValueError):
+    """Move log không hợp lệ (nước đi không làm thay đổi bàn cờ, ký hiệu lạ...)."""
+
+
+def _replay_packed(seed, log):
+    """Replay trên bàn cờ 64-bit. Raise OverflowError nếu có ô lớn hơn 32768."""
+    board, _ = add_random_tile(0, tile_rng(seed, 0))
+    board, _ = add_random_tile(board, tile_rng(seed, 1))
+    score = 0
+    moves = 0
+
+    for position, token in log_tokens(log):
+        rng = tile_rng(seed, position + 2)
+        direction = TOKEN_MOVES.get(token)
+        if direction:
+            new_board, gained = move_and_score(board, direction)
+            if new_board == board:
+                raise ReplayError(f"Nước đi không hợp lệ tại vị trí {position}")
+            board, _ = add_random_tile(new_board, rng)
+            score += gained
+            moves += 1
+            continue
+
+        grid = unpack_board(board)
+        if token == SHUFFLE_TOKEN:
+            cells = [(r, c) for r in range(4) for c in range(4) if grid[r][c]]
+            tiles = [grid[r][c] for r, c in cells]
+            rng.shuffle(tiles)
+            for (r, c), value in zip(cells, tiles):
+                grid[r][c] = value
+        elif token[0] == SWAP_TOKEN and len(token) == 3:
+            a = ord(token[1]) - ord("a")
+            b = ord(token[2]) - ord("a")
+            if not (0 <= a < 16 and 0 <= b < 16) or a == b or not grid[a // 4][a % 4] or not grid[b // 4][b % 4]:
+                raise ReplayError(f"Swap không hợp lệ tại vị trí {position}")
+            grid[a // 4][a % 4], grid[b // 4][b % 4] = grid[b // 4][b % 4], grid[a // 4][a % 4]
+        else:
+            raise ReplayError(f"Ký hiệu không hợp lệ tại vị trí {position}")
+        board = pack_grid(grid)
+
+    _, _, movable = board_stats(board)
+    return {"score": score, "max_tile": max_tile(board), "moves": moves, "game_over": not movable}
+
+
+def _replay_engine(seed, log):
+    """Replay bằng BitboardGame2048 (chậm hơn, hỗ trợ ô lớn hơn 32768)."""
+    g = BitboardGame2048()
+    g.setup(seed)
+    for position, token in log_tokens(log):
+        direction = TOKEN_MOVES.get(token)
+        if direction:
+            if not g.move(direction).get("changed"):
+                raise ReplayError(f"Nước đi không hợp lệ tại vị trí {position}")
+        elif token == SHUFFLE_TOKEN:
+            g.shuffle()
+        elif token[0] == SWAP_TOKEN and len(token) == 3:
+            a = ord(token[1]) - ord("a")
+            b = ord(token[2]) - ord("a")
+            if not g.swap_two_tiles(a // 4, a % 4, b // 4, b % 4).get("ok"):
+                raise ReplayError(f"Swap không hợp lệ tại vị trí {position}")
+        else:
+            raise ReplayError(f"Ký hiệu không hợp lệ tại vị trí {position}")
+    return {"score": g.score, "max_tile": g.max_tile(), "moves": g.moves, "game_over": not g.any_moves_left()}
+
+
+def replay_game(seed, log):
+    """Chơi lại ván từ seed và move log. Trả về dict score, max_tile, moves, game_over."""
+    try:
+        return _replay_packed(seed, log)
+    except (OverflowError, ValueError) as e:
+        if isinstance(e, ReplayError):
+            raise
+        return _replay_engine(seed, log)
+
+
+def verify_score(seed, log, score, max_tile, moves, require_game_over=True):
+    """
+    Xác minh điểm được gửi lên bằng replay.
+    Trả về (True, None) nếu khớp, ngược lại (False, lý do).
+    """
+    try:
+        result = replay_game(seed, log)
+    except ReplayError as e:
+        return False, str(e)
+
+    if require_game_over and not result["game_over"]:
+        return False, "Ván chơi chưa kết thúc"
+    for key, claimed in (("score", score), ("max_tile", max_tile), ("moves", moves)):
+        if result[key] != claimed:
+            return False, f"{key} không khớp"
+    return True, None
+
+
+def verify_scores(claims, require_game_over=True):
+    """Xác minh nhiều ván; claims là list dict có seed, log, score, max_tile, moves."""
+    return [
+        verify_score(
+            claim["seed"], claim["log"], claim["score"], claim["max_tile"], claim["moves"],
+            require_game_over=require_game_over
+        )
+        for claim in claims
+    ]
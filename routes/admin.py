@@ -2,9 +2,11 @@
 Admin routes for seeding database and management tasks.
 """
 
+import os
 from flask import jsonify
 from config import app, db
 from models import PremiumPlan
+from hint_solver import get_precomputer, get_shared_table
 
 
 @app.route("/admin/seed-premium-plans", methods=["GET"])
@@ -132,3 +134,17 @@ def update_premium_prices():
             "status": "error",
             "message": f"Error updating prices: {str(e)}"
         }), 500
+
+
+@app.route("/admin/hint-cache", methods=["GET"])
+def hint_cache_stats():
+    """Thống kê transposition table của hint engine trong worker hiện tại."""
+    table = get_shared_table(app.config["HINT_CACHE_MAX_ENTRIES"])
+    speculation = None
+    if app.config["HINT_SPECULATE"]:
+        speculation = get_precomputer(
+            app.config["HINT_SPECULATE_WORKERS"],
+            app.config["HINT_SPECULATE_MAX_PENDING"],
+            app.config["HINT_SPECULATE_CACHE_SIZE"]
+        ).stats()
+    return jsonify({"status": "success", "pid": os.getpid(), **table.stats(), "speculation": speculation}), 200
@@ -1,21 +1,25 @@
+import time
 import uuid
-from flask import request, jsonify, session
+from flask import request, jsonify
 from flask_login import login_required, current_user
 from config import app, db
-from models import Score, Order
-from game_logic import Game2048
-from helpers import load_game, save_game
+from entitlements import has_premium
+from models import Order
+from helpers import clear_game, has_game, load_game, new_game, save_game
+from hint_solver import get_precomputer, get_shared_table
+from replay import verify_score
+from rank_index import get_rank_index
+from score_ingest import ingest_score
+from scoring import claim_game
 
 
 @app.route("/api/load_game", methods=["GET"])
 @login_required
 def load_current_game():
     """API endpoint to load current game state."""
-    if "game_state" not in session:
+    if not has_game():
         # Nếu không có game state, tạo game mới
-        g = Game2048()
-        result = g.setup()
-        save_game(g)
+        g, result = new_game()
         return jsonify({"ok": True, **result, "can_undo": False})
     
     # Load game hiện tại
@@ -25,7 +29,7 @@ def load_current_game():
         "grid": g.grid,
         "score": g.score,
         "moves": g.moves,
-        "can_undo": g.last_state is not None
+        "can_undo": g.undo_levels() > 0
     })
 
 
@@ -33,9 +37,7 @@ def load_current_game():
 @login_required
 def start_game():
     """API endpoint to start a new game."""
-    g = Game2048()
-    result = g.setup()
-    save_game(g)
+    g, result = new_game()
     return jsonify({"ok": True, **result, "can_undo": False})
 
 
@@ -43,7 +45,7 @@ def start_game():
 @login_required
 def move():
     """API endpoint to make a move in the game."""
-    if "game_state" not in session:
+    if not has_game():
         return jsonify({"ok": False, "message": "Chưa khởi tạo trò chơi"}), 400
 
     payload = request.get_json(silent=True) or {}
@@ -52,79 +54,294 @@ def move():
         return jsonify({"ok": False, "message": "Hướng không hợp lệ"}), 400
 
     g = load_game()
+    before = [row[:] for row in g.grid] if payload.get("compact") else None
     result = g.move(direction)
 
-  
-    resp = {"ok": True, **result, "can_undo": g.last_state is not None}
+    over = _finish_game(g) if result.get("changed") else None
+    if not over:
+        save_game(g)
+        if result.get("changed"):
+            _speculate_hint(g)
 
-    if result.get("changed"):
-    
+    if before is not None:
+        return jsonify(_compact_response(before, g, result.get("new_tile", []), result.get("merged_cells", []), over))
+
+    resp = {"ok": True, "grid": g.grid, **result, "can_undo": g.undo_levels() > 0}
+    if over:
+        resp["game_over"] = over
+    return jsonify(resp)
+
+
+@app.route("/api/moves", methods=["POST"])
+@login_required
+def moves():
+    """API endpoint to apply a batch of moves in one request (one session load/save)."""
+    if not has_game():
+        return jsonify({"ok": False, "message": "Chưa khởi tạo trò chơi"}), 400
+
+    payload = request.get_json(silent=True) or {}
+    directions = payload.get("directions")
+    if not isinstance(directions, list) or not directions:
+        return jsonify({"ok": False, "message": "Danh sách hướng không hợp lệ"}), 400
+    if len(directions) > app.config["MOVE_BATCH_MAX"]:
+        return jsonify({"ok": False, "message": "Quá nhiều nước đi trong một lần gửi"}), 400
+    if any(direction not in ("up", "down", "left", "right") for direction in directions):
+        return jsonify({"ok": False, "message": "Hướng không hợp lệ"}), 400
+
+    g = load_game()
+    compact = bool(payload.get("compact"))
+    steps = []
+    deltas = []
+    over = None
+    for direction in directions:
+        score = g.score
+        before = [row[:] for row in g.grid] if compact else None
+        result = g.move(direction)
+        if compact:
+            deltas.append(_grid_delta(before, g.grid, g.size))
+        steps.append({
+            "direction": direction,
+            "changed": bool(result.get("changed")),
+            "gained": g.score - score,
+            "merged_cells": result.get("merged_cells", []),
+            "new_tile": result.get("new_tile", [])
+        })
+        if result.get("changed") and not g.any_moves_left():
+            over = _finish_game(g)
+            break
+
+    if not over:
         save_game(g)
-     
-        over = g.check_game_over() 
+        if any(step["changed"] for step in steps):
+            _speculate_hint(g)
+
+    if compact:
+        # d/n/x/g là các mảng song song theo từng nước đi để client phát lại hiệu ứng
+        resp = {
+            "ok": 1,
+            "k": len(steps),
+            "d": deltas,
+            "n": [_cell_indices(step["new_tile"], g.size) for step in steps],
+            "x": [_cell_indices(step["merged_cells"], g.size) for step in steps],
+            "g": [step["gained"] for step in steps],
+            "s": g.score,
+            "m": g.moves,
+            "u": int(g.undo_levels() > 0)
+        }
         if over:
-           
-            score_entry = Score(
-                user_id=current_user.id,
-                score=g.score,
-                max_tile=g.max_tile(),
-                moves=g.moves
-            )
-            db.session.add(score_entry)
-            db.session.commit()
-           
-            session.pop("game_state", None)
-            resp["game_over"] = over
-    else:
-       
-        save_game(g)
+            resp["o"] = over
+        return jsonify(resp)
 
+    resp = {
+        "ok": True,
+        "grid": g.grid,
+        "score": g.score,
+        "moves": g.moves,
+        "applied": len(steps),
+        "steps": steps,
+        "can_undo": g.undo_levels() > 0
+    }
+    if over:
+        resp["game_over"] = over
     return jsonify(resp)
 
 
+def _hint_options():
+    """Tham số hint engine từ config."""
+    return {
+        "depth": app.config["HINT_SEARCH_DEPTH"],
+        "node_budget": app.config["HINT_NODE_BUDGET"],
+        "table": get_shared_table(app.config["HINT_CACHE_MAX_ENTRIES"]),
+        "deadline_ms": app.config["HINT_DEADLINE_MS"],
+        "pool_size": app.config["HINT_POOL_SIZE"]
+    }
+
+
+def _hint_precomputer():
+    """HintPrecomputer của process, hoặc None nếu tắt HINT_SPECULATE."""
+    if not app.config["HINT_SPECULATE"]:
+        return None
+    return get_precomputer(
+        app.config["HINT_SPECULATE_WORKERS"],
+        app.config["HINT_SPECULATE_MAX_PENDING"],
+        app.config["HINT_SPECULATE_CACHE_SIZE"]
+    )
+
+
+def _speculate_hint(g):
+    """Sau khi lưu nước đi của user premium: tính trước gợi ý cho bàn cờ mới."""
+    precomputer = _hint_precomputer()
+    if precomputer is None or not has_premium():
+        return
+    board = g.board
+    if board is not None:
+        precomputer.submit(board, owner=current_user.id, **_hint_options())
+
+
+def _grid_delta(before, after, size):
+    """Các ô thay đổi giữa hai bàn cờ: [chỉ số, giá trị, ...] với chỉ số = r * size + c."""
+    delta = []
+    for r, (old_row, new_row) in enumerate(zip(before, after)):
+        if old_row != new_row:
+            for c, value in enumerate(new_row):
+                if old_row[c] != value:
+                    delta += (r * size + c, value)
+    return delta
+
+
+def _cell_indices(cells, size):
+    """Danh sách ô {r, c} -> chỉ số r * size + c."""
+    return [cell["r"] * size + cell["c"] for cell in cells]
+
+
+def _compact_response(before, g, new_tiles, merged_cells, over):
+    """
+    Response rút gọn cho client gửi "compact": true.
+    d: các ô thay đổi [chỉ số, giá trị, ...] với chỉ số = r * 4 + c,
+    s/m: score/moves, n/x: chỉ số ô mới/ô gộp, u: còn undo, o: game over.
+    /api/moves trả d/n/x (và g: điểm cộng thêm) dạng mảng theo từng nước đi.
+    """
+    resp = {
+        "ok": 1,
+        "d": _grid_delta(before, g.grid, g.size),
+        "s": g.score,
+        "m": g.moves,
+        "n": _cell_indices(new_tiles, g.size),
+        "x": _cell_indices(merged_cells, g.size),
+        "u": int(g.undo_levels() > 0)
+    }
+    if over:
+        resp["o"] = over
+    return resp
+
+
+def _finish_game(g):
+    """Nếu hết nước đi: lưu điểm, xoá game khỏi session và trả về thông tin game over."""
+    over = g.check_game_over()
+    if not over:
+        return None
+
+    # Seed được nhận trong cùng lần ghi điểm (không commit riêng): ván chơi tiếp
+    # hoặc gửi lại sau khi seed đã được ghi sẽ không được ghi điểm lần nữa
+    ingest_score(app.config, current_user.id, g.score, g.max_tile(), g.moves, seed=g.seed)
+    clear_game(game_over=True)
+    # seed + move log để client xem lại / chia sẻ ván (replay.verify_score)
+    return {**over, "seed": g.seed, "log": g.log}
+
+
 @app.route("/api/undo", methods=["POST"])
 @login_required
 def undo():
-    """API endpoint to undo the last move."""
-    if "game_state" not in session:
+    """API endpoint to undo one or more moves (multi-level undo is premium)."""
+    if not has_game():
         return jsonify({"ok": False, "message": "Chưa khởi tạo trò chơi"}), 400
 
+    payload = request.get_json(silent=True) or {}
+    try:
+        steps = max(1, int(payload.get("steps", 1)))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "message": "Số bước không hợp lệ"}), 400
+
     g = load_game()
-    result = g.undo()
-    save_game(g) 
-    return jsonify({"ok": True, **result, "can_undo": False})
+    if has_premium():
+        result = g.undo(steps)
+    else:
+        # Tài khoản thường chỉ được hoàn tác 1 bước và không được làm lại, giống trước đây
+        result = g.undo(1)
+        g.clear_history()
+    save_game(g)
+    return jsonify({
+        "ok": True,
+        **result,
+        "undo_levels": g.undo_levels(),
+        "can_undo": g.undo_levels() > 0,
+        "can_redo": bool(g.redo_stack)
+    })
+
+
+@app.route("/api/redo", methods=["POST"])
+@login_required
+def redo():
+    """API endpoint to redo moves undone with /api/undo (premium feature)."""
+    if not has_premium():
+        return jsonify({"ok": False, "message": "Chức năng premium. Vui lòng nâng cấp!"}), 403
+
+    if not has_game():
+        return jsonify({"ok": False, "message": "Chưa khởi tạo trò chơi"}), 400
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        steps = max(1, int(payload.get("steps", 1)))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "message": "Số bước không hợp lệ"}), 400
+
+    g = load_game()
+    result = g.redo(steps)
+    save_game(g)
+    return jsonify({
+        "ok": True,
+        **result,
+        "undo_levels": g.undo_levels(),
+        "can_undo": g.undo_levels() > 0,
+        "can_redo": bool(g.redo_stack)
+    })
 
 
 @app.route("/api/submit_score", methods=["POST"])
 @login_required
 def submit_score():
-    """API endpoint to submit a score."""
+    """API endpoint to submit a score, verified by replaying seed + move log."""
     payload = request.get_json(silent=True) or {}
     try:
         score = int(payload.get("score", 0))
         max_tile = int(payload.get("max_tile", 2))
         moves = int(payload.get("moves", 0))
+        seed = int(payload.get("seed"))
+        log = str(payload.get("log", ""))
     except (TypeError, ValueError):
         return jsonify({"ok": False, "message": "Payload không hợp lệ"}), 400
 
-    if score < 0 or max_tile < 2 or moves < 0:
+    if score < 0 or max_tile < 2 or moves < 0 or not 0 <= seed < 2 ** 63:
         return jsonify({"ok": False, "message": "Giá trị không hợp lệ"}), 400
 
-    s = Score(user_id=current_user.id, score=score, max_tile=max_tile, moves=moves)
-    db.session.add(s)
-    db.session.commit()
+    valid, reason = verify_score(seed, log, score, max_tile, moves)
+    if not valid:
+        return jsonify({"ok": False, "message": f"Điểm không hợp lệ: {reason}"}), 400
+
+    # Chỉ ghi ván có seed do server phát cho chính user này và chưa được ghi
+    # (ván kết thúc qua /api/move đã được ghi và nhận seed ở _finish_game)
+    if not claim_game(current_user.id, seed):
+        return jsonify({"ok": False, "message": "Ván không hợp lệ hoặc đã được ghi điểm"}), 409
+
+    ingest_score(app.config, current_user.id, score, max_tile, moves)
     return jsonify({"ok": True})
 
 
+@app.route("/api/rank")
+@login_required
+def rank():
+    """API endpoint for global rank and percentile (current user's best, or ?score=)."""
+    score = request.args.get("score", type=int)
+    if score is not None and score < 0:
+        return jsonify({"ok": False, "message": "Điểm không hợp lệ"}), 400
+
+    result = get_rank_index(app.config).lookup(current_user.id, score)
+    if result is None:
+        # Rank index đang được dựng lần đầu (thread nền) - client thử lại sau
+        response = jsonify({"ok": False, "warming": True, "message": "Bảng xếp hạng đang khởi động"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+    return jsonify({"ok": True, **result})
+
+
 @app.route("/api/me")
 @login_required
 def me():
     """API endpoint to get current user info."""
-    current_user.check_premium_status()
     return jsonify({
         "id": current_user.id, 
         "username": current_user.username,
-        "is_premium": current_user.is_premium,
+        "is_premium": has_premium(),
         "premium_days_left": current_user.get_premium_days_left(),
         "premium_expires_at": current_user.premium_expires_at.strftime("%Y-%m-%d %H:%M:%S") if current_user.premium_expires_at else None
     })
@@ -134,9 +351,7 @@ def me():
 @login_required
 def cancel_premium():
     """API endpoint to cancel Premium subscription."""
-    current_user.check_premium_status()
-    
-    if not current_user.is_premium:
+    if not has_premium():
         return jsonify({"ok": False, "message": "Bạn chưa có Premium để hủy"}), 400
     
     # Ghi lại lịch sử hủy Premium vào orders
@@ -163,18 +378,39 @@ def cancel_premium():
 @login_required
 def hint():
     """API endpoint to get game hint (premium feature)"""
-    current_user.check_premium_status()
-    if not current_user.is_premium:
+    started = time.perf_counter()
+    if not has_premium():
         return jsonify({"ok": False, "message": "Chức năng premium. Vui lòng nâng cấp!"}), 403
     
-    if "game_state" not in session:
+    if not has_game():
         return jsonify({"ok": False, "message": "Chưa khởi tạo trò chơi"}), 400
     
     g = load_game()
-    result = g.get_hint()
+    options = _hint_options()
+    precomputer = _hint_precomputer()
+    board = g.board if precomputer else None
+
+    # Một deadline cho cả request: chờ việc tính trước và tự tính dùng chung
+    deadline_ms = options["deadline_ms"]
+    result = None
+    if board is not None:
+        # Kết quả tính trước sau /api/move (chờ việc đang chạy tới hết deadline)
+        timeout = max(0.0, deadline_ms / 1000.0 - (time.perf_counter() - started)) if deadline_ms else None
+        result = precomputer.get(board, timeout=timeout)
+    if result is None:
+        if deadline_ms:
+            # Chỉ phần thời gian còn lại (tối thiểu 1ms: độ sâu 1 luôn hoàn thành)
+            options["deadline_ms"] = max(1, deadline_ms - (time.perf_counter() - started) * 1000)
+        result = g.get_hint(**options)
+        if board is not None and result:
+            precomputer.put(board, result)
     if result:
-        save_game(g)
-        return jsonify({"ok": True, "direction": result.get("direction")})
+        return jsonify({
+            "ok": True,
+            "direction": result.get("direction"),
+            "scores": result.get("scores"),
+            "depth": result.get("depth")
+        })
     
     return jsonify({"ok": False, "message": "Không có gợi ý"}), 400
 
@@ -183,11 +419,10 @@ def hint():
 @login_required
 def shuffle():
     """API endpoint to shuffle board (premium feature)"""
-    current_user.check_premium_status()
-    if not current_user.is_premium:
+    if not has_premium():
         return jsonify({"ok": False, "message": "Chức năng premium. Vui lòng nâng cấp!"}), 403
     
-    if "game_state" not in session:
+    if not has_game():
         return jsonify({"ok": False, "message": "Chưa khởi tạo trò chơi"}), 400
     
     g = load_game()
@@ -200,11 +435,10 @@ def shuffle():
 @login_required
 def swap_tiles():
     """API endpoint to swap two tiles (premium feature)"""
-    current_user.check_premium_status()
-    if not current_user.is_premium:
+    if not has_premium():
         return jsonify({"ok": False, "message": "Chức năng premium. Vui lòng nâng cấp!"}), 403
     
-    if "game_state" not in session:
+    if not has_game():
         return jsonify({"ok": False, "message": "Chưa khởi tạo trò chơi"}), 400
     
     data = request.get_json()
@@ -3,6 +3,7 @@ from flask import request, redirect, url_for, flash, render_template, session
 from flask_login import login_user, login_required, logout_user
 from config import app, db, google
 from models import User
+from helpers import clear_game
 
 
 @app.route("/register", methods=["GET", "POST"])
@@ -49,7 +50,7 @@ def login():
 def logout():
     """User logout route."""
     logout_user()
-    session.pop("game_state", None)
+    clear_game()
     flash("Đã đăng xuất.", "info")
     return redirect(url_for("login"))
 
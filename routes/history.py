@@ -2,58 +2,129 @@
 Game History routes - Xem lại lịch sử chơi game
 """
 
-from flask import render_template, request
+import base64
+from datetime import datetime
+from flask import jsonify, render_template, request
 from flask_login import login_required, current_user
 from config import app, db
-from models import Score
-from sqlalchemy import desc
+from models import Score, UserStats
+from sqlalchemy import and_, desc, or_
+
+
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def encode_cursor(score):
+    """Cursor mờ cho vị trí (created_at, id) của một ván."""
+    raw = f"{score.created_at.isoformat()}|{score.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Giải mã cursor thành (created_at, id). Raise ValueError nếu không hợp lệ."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, score_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(score_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Cursor không hợp lệ: {e}")
+
+
+def history_page(user_id, after=None, before=None, per_page=PER_PAGE):
+    """
+    Một trang lịch sử theo keyset (created_at, id), mới nhất trước.
+    after: cursor của dòng cuối trang trước (đi tiếp), before: cursor của dòng
+    đầu trang sau (quay lại). Chi phí như nhau ở mọi trang (index
+    scores(user_id, created_at, id)), không dùng OFFSET/COUNT.
+    Trả về (danh sách Score, cursor trang sau hoặc None, cursor trang trước hoặc None).
+    """
+    query = Score.query.filter(Score.user_id == user_id)
+    if before:
+        created_at, score_id = decode_cursor(before)
+        rows = (
+            query.filter(or_(Score.created_at > created_at,
+                             and_(Score.created_at == created_at, Score.id > score_id)))
+            .order_by(Score.created_at.asc(), Score.id.asc())
+            .limit(per_page + 1)
+            .all()
+        )
+        has_prev = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after:
+            created_at, score_id = decode_cursor(after)
+            query = query.filter(or_(Score.created_at < created_at,
+                                     and_(Score.created_at == created_at, Score.id < score_id)))
+        rows = query.order_by(desc(Score.created_at), desc(Score.id)).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    next_cursor = encode_cursor(rows[-1]) if rows and has_next else None
+    prev_cursor = encode_cursor(rows[0]) if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
 
 
 @app.route("/history")
 @login_required
 def game_history():
     """Hiển thị lịch sử chơi game của user"""
-    # Pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    
-    # Lấy lịch sử scores của user hiện tại
-    pagination = Score.query.filter_by(user_id=current_user.id)\
-        .order_by(desc(Score.created_at))\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    scores = pagination.items
-    
-    # Tính toán thống kê
-    total_games = Score.query.filter_by(user_id=current_user.id).count()
-    
-    if total_games > 0:
-        best_score = db.session.query(db.func.max(Score.score))\
-            .filter(Score.user_id == current_user.id).scalar() or 0
-        
-        best_tile = db.session.query(db.func.max(Score.max_tile))\
-            .filter(Score.user_id == current_user.id).scalar() or 0
-        
-        avg_score = db.session.query(db.func.avg(Score.score))\
-            .filter(Score.user_id == current_user.id).scalar() or 0
-        
-        total_moves = db.session.query(db.func.sum(Score.moves))\
-            .filter(Score.user_id == current_user.id).scalar() or 0
-    else:
-        best_score = 0
-        best_tile = 0
-        avg_score = 0
-        total_moves = 0
-    
-    stats = {
-        'total_games': total_games,
-        'best_score': int(best_score),
-        'best_tile': int(best_tile),
-        'avg_score': round(float(avg_score), 1),
-        'total_moves': int(total_moves)
+    # Keyset pagination: ?after=<cursor> / ?before=<cursor>, n = số thứ tự dòng đầu trang
+    start = max(1, request.args.get('n', 1, type=int))
+    try:
+        scores, next_cursor, prev_cursor = history_page(
+            current_user.id, request.args.get('after'), request.args.get('before')
+        )
+    except ValueError:
+        scores, next_cursor, prev_cursor = history_page(current_user.id)
+        start = 1
+
+    # Thống kê đọc từ user_stats (một lần đọc theo khoá chính)
+    user_stats = db.session.get(UserStats, current_user.id)
+    stats = (user_stats or UserStats()).as_dict()
+
+    pagination = {
+        'start': start,
+        'page': (start - 1) // PER_PAGE + 1,
+        'pages': max(1, -(-stats['total_games'] // PER_PAGE)),
+        'next': next_cursor,
+        'prev': prev_cursor,
+        'next_n': start + len(scores),
+        'prev_n': max(1, start - PER_PAGE),
     }
     
     return render_template("game_history.html",
                          scores=scores,
                          stats=stats,
                          pagination=pagination)
+
+
+@app.route("/api/history")
+@login_required
+def api_history():
+    """Lịch sử ván dạng JSON với cursor (?after= / ?before=, ?limit=)."""
+    limit = min(MAX_PER_PAGE, max(1, request.args.get('limit', PER_PAGE, type=int)))
+    try:
+        scores, next_cursor, prev_cursor = history_page(
+            current_user.id, request.args.get('after'), request.args.get('before'), limit
+        )
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
+    return jsonify({
+        "ok": True,
+        "items": [
+            {
+                "id": s.id,
+                "score": s.score,
+                "max_tile": s.max_tile,
+                "moves": s.moves,
+                "created_at": s.created_at.isoformat()
+            }
+            for s in scores
+        ],
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor
+    })
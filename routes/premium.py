@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from flask import request, redirect, url_for, flash, render_template, session, jsonify
 from flask_login import login_required, current_user, login_user, logout_user
 from config import app, db
+from entitlements import has_premium
 from models import PremiumPlan, Order, User
 from payos_config import PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY, PAYOS_RETURN_URL, PAYOS_CANCEL_URL
 from payos_helper import PayOS
@@ -44,8 +45,6 @@ def premium_packages():
 @login_required
 def premium_manage():
     """Trang quản lý Premium."""
-    current_user.check_premium_status()
-    
     # Lấy các gói Premium có sẵn
     plans = PremiumPlan.query.filter_by(is_active=True).order_by(PremiumPlan.price).all()
     
@@ -55,7 +54,7 @@ def premium_manage():
     return render_template("premium_manage.html", 
                          plans=plans, 
                          orders=orders,
-                         is_premium=current_user.is_premium,
+                         is_premium=has_premium(),
                          premium_expires_at=current_user.premium_expires_at)
 
 
@@ -0,0 +1,265 @@
+"""
+Migration schema có phiên bản, chỉ thêm (không drop bảng, không mất dữ liệu).
+
+Phiên bản hiện tại lưu trong bảng schema_version. Mỗi migration chạy trong
+transaction riêng và chỉ chạy một lần; thêm migration mới bằng cách nối vào
+MIGRATIONS với số phiên bản tăng dần.
+
+    flask db-migrate           # chạy các migration còn thiếu
+    flask db-check-indexes     # báo index còn thiếu so với các truy vấn trong routes/
+"""
+
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData,
+    Numeric, String, Table, Text, func, inspect, select, text,
+)
+
+_metadata = MetaData()
+schema_version = Table(
+    "schema_version", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Index cần cho các truy vấn nóng hiện tại (chỉ dùng cho db-check-indexes,
+# migration không đọc danh sách này): (tên, bảng, cột, nơi dùng)
+REQUIRED_INDEXES = (
+    ("ix_scores_user_history", "scores", ("user_id", "created_at", "id"),
+     "routes/history.py: lịch sử ván theo user (keyset created_at, id)"),
+    ("ix_scores_user_score", "scores", ("user_id", "score"),
+     "routes/history.py: điểm cao nhất / trung bình theo user"),
+    ("ix_scores_rank", "scores", ("score", "max_tile", "moves"),
+     "scoring.backfill_user_best, xếp hạng theo điểm"),
+    ("ix_orders_user_created", "orders", ("user_id", "created_at"),
+     "routes/premium.py: đơn hàng gần nhất của user"),
+    ("ix_user_best_rank", "user_best", ("score", "max_tile", "moves", "created_at"),
+     "routes/game.py: leaderboard top 20"),
+    ("ix_user_best_period_rank", "user_best_period", ("period", "bucket_start", "score", "max_tile", "moves"),
+     "routes/game.py: leaderboard theo ngày/tuần"),
+)
+
+
+# Mỗi migration tự khai báo schema tại thời điểm nó được viết (không đọc
+# models.py), nên một số phiên bản luôn cho ra cùng một schema.
+
+def _referenced_tables(metadata):
+    """Bảng users / scores tối giản để khai báo khoá ngoại (không tạo)."""
+    Table("users", metadata, Column("id", Integer, primary_key=True))
+    Table("scores", metadata, Column("id", Integer, primary_key=True))
+
+
+def _v1_initial_tables(conn):
+    """Các bảng của ứng dụng trước khi có schema_version (bảng đã có được giữ nguyên)."""
+    metadata = MetaData()
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("username", String(50), unique=True, nullable=False),
+        Column("password_hash", String(255), nullable=True),
+        Column("email", String(120), unique=True, nullable=True),
+        Column("google_id", String(255), unique=True, nullable=True),
+        Column("is_premium", Boolean, nullable=False),
+        Column("premium_expires_at", DateTime, nullable=True),
+        Column("created_at", DateTime, server_default=func.now()),
+    )
+    Table(
+        "scores", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        Column("score", Integer, nullable=False),
+        Column("max_tile", Integer, nullable=False),
+        Column("moves", Integer, nullable=False),
+        Column("created_at", DateTime, server_default=func.now()),
+    )
+    Table(
+        "premium_plans", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String(50), nullable=False),
+        Column("duration_days", Integer, nullable=False),
+        Column("price", Numeric(10, 2), nullable=False),
+        Column("description", Text),
+        Column("is_active", Boolean, nullable=False),
+    )
+    Table(
+        "orders", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        Column("plan_id", Integer, ForeignKey("premium_plans.id"), nullable=True),
+        Column("amount", Numeric(10, 2), nullable=False),
+        Column("status", String(20), nullable=False),
+        Column("payment_method", String(50)),
+        Column("transaction_id", String(100), unique=True),
+        Column("created_at", DateTime, server_default=func.now()),
+        Column("completed_at", DateTime),
+    )
+    Table(
+        "game_states", metadata,
+        Column("id", String(32), primary_key=True),
+        Column("data", LargeBinary, nullable=False),
+        Column("updated_at", DateTime, nullable=False, index=True),
+    )
+    Table(
+        "saved_games", metadata,
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        Column("data", LargeBinary, nullable=False),
+        Column("moves", Integer, nullable=False),
+        Column("updated_at", DateTime, nullable=False),
+    )
+    user_best = Table(
+        "user_best", metadata,
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        Column("score_id", Integer, ForeignKey("scores.id", ondelete="SET NULL"), nullable=True),
+        Column("score", Integer, nullable=False),
+        Column("max_tile", Integer, nullable=False),
+        Column("moves", Integer, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+    )
+    Index("ix_user_best_rank", user_best.c.score.desc(), user_best.c.max_tile.desc(),
+          user_best.c.moves, user_best.c.created_at)
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _create_missing_indexes(conn, table, indexes):
+    """Tạo các index (tên, cột) chưa có trên `table`."""
+    existing = {index["name"] for index in inspect(conn).get_indexes(table)}
+    metadata = MetaData()
+    target = Table(table, metadata, autoload_with=conn)
+    for name, columns in indexes:
+        if name not in existing:
+            Index(name, *(target.c[column] for column in columns)).create(conn)
+
+
+def _v2_hot_query_indexes(conn):
+    """Index cho các truy vấn scores/orders."""
+    _create_missing_indexes(conn, "scores", (
+        ("ix_scores_user_created", ("user_id", "created_at")),
+        ("ix_scores_user_score", ("user_id", "score")),
+        ("ix_scores_rank", ("score", "max_tile", "moves")),
+    ))
+    _create_missing_indexes(conn, "orders", (
+        ("ix_orders_user_created", ("user_id", "created_at")),
+    ))
+
+
+def _v3_user_best_period(conn):
+    """Bảng user_best_period (leaderboard theo ngày/tuần)."""
+    metadata = MetaData()
+    _referenced_tables(metadata)
+    table = Table(
+        "user_best_period", metadata,
+        Column("period", String(8), primary_key=True),
+        Column("bucket_start", Date, primary_key=True),
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        Column("score_id", Integer, ForeignKey("scores.id", ondelete="SET NULL"), nullable=True),
+        Column("score", Integer, nullable=False),
+        Column("max_tile", Integer, nullable=False),
+        Column("moves", Integer, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+    )
+    Index("ix_user_best_period_rank", table.c.period, table.c.bucket_start, table.c.score.desc(),
+          table.c.max_tile.desc(), table.c.moves, table.c.created_at)
+    table.create(conn, checkfirst=True)
+
+
+def _v4_user_stats(conn):
+    """Bảng user_stats (thống kê trang lịch sử)."""
+    metadata = MetaData()
+    _referenced_tables(metadata)
+    Table(
+        "user_stats", metadata,
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        Column("total_games", Integer, nullable=False),
+        Column("total_score", BigInteger, nullable=False),
+        Column("total_moves", BigInteger, nullable=False),
+        Column("best_score", Integer, nullable=False),
+        Column("best_tile", Integer, nullable=False),
+        Column("updated_at", DateTime, nullable=False),
+    ).create(conn, checkfirst=True)
+
+
+def _v5_keyset_history_index(conn):
+    """Index (user_id, created_at, id) cho keyset pagination thay cho (user_id, created_at)."""
+    _create_missing_indexes(conn, "scores", (
+        ("ix_scores_user_history", ("user_id", "created_at", "id")),
+    ))
+    if "ix_scores_user_created" in {index["name"] for index in inspect(conn).get_indexes("scores")}:
+        metadata = MetaData()
+        scores = Table("scores", metadata, autoload_with=conn)
+        Index("ix_scores_user_created", scores.c.user_id, scores.c.created_at).drop(conn)
+
+
+def _v6_issued_games(conn):
+    """Bảng issued_games (seed đã phát, chỉ ghi điểm một lần)."""
+    metadata = MetaData()
+    _referenced_tables(metadata)
+    Table(
+        "issued_games", metadata,
+        Column("seed", BigInteger, primary_key=True, autoincrement=False),
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        Column("issued_at", DateTime, nullable=False, index=True),
+    ).create(conn, checkfirst=True)
+
+
+def _v7_saved_game_version(conn):
+    """Cột saved_games.version: checkpoint cũ hơn không ghi đè checkpoint / dấu xoá mới hơn."""
+    if "version" not in {column["name"] for column in inspect(conn).get_columns("saved_games")}:
+        conn.execute(text("ALTER TABLE saved_games ADD COLUMN version BIGINT NOT NULL DEFAULT 0"))
+
+
+MIGRATIONS = (
+    (1, "Tạo các bảng còn thiếu", _v1_initial_tables),
+    (2, "Index cho truy vấn scores/orders", _v2_hot_query_indexes),
+    (3, "Bảng user_best_period (leaderboard theo ngày/tuần)", _v3_user_best_period),
+    (4, "Bảng user_stats (thống kê trang lịch sử)", _v4_user_stats),
+    (5, "Index keyset cho lịch sử ván", _v5_keyset_history_index),
+    (6, "Bảng issued_games (seed đã phát cho user)", _v6_issued_games),
+    (7, "Cột version cho saved_games (checkpoint)", _v7_saved_game_version),
+)
+
+
+def current_version(engine):
+    """Phiên bản schema hiện tại (0 nếu chưa chạy migration nào)."""
+    _metadata.create_all(engine, checkfirst=True)
+    with engine.connect() as conn:
+        versions = conn.execute(select(schema_version.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def run_migrations(engine, log=print):
+    """Chạy các migration chưa áp dụng theo thứ tự. Trả về danh sách phiên bản đã chạy."""
+    applied = []
+    version = current_version(engine)
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_version.insert().values(
+                version=number, description=description, applied_at=datetime.now()
+            ))
+        applied.append(number)
+        if log:
+            log(f"Migration {number}: {description}")
+    return applied
+
+
+def missing_indexes(engine):
+    """
+    So sánh REQUIRED_INDEXES với index thực tế (khớp theo tiền tố cột, kể cả
+    khoá chính). Trả về danh sách (tên, bảng, cột, nơi dùng) còn thiếu.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for name, table, columns, usage in REQUIRED_INDEXES:
+        if table not in tables:
+            missing.append((name, table, columns, usage))
+            continue
+        candidates = [tuple(index["column_names"]) for index in inspector.get_indexes(table)]
+        candidates.append(tuple(inspector.get_pk_constraint(table)["constrained_columns"]))
+        if not any(candidate[:len(columns)] == columns for candidate in candidates):
+            missing.append((name, table, columns, usage))
+    return missing
@@ -0,0 +1,187 @@
+"""
+Hàng đợi ghi điểm kiểu write-behind cho các ván đã kết thúc.
+
+Request game over chỉ đưa ván vào bộ đệm trong bộ nhớ; một thread nền ghi
+theo lô (bulk insert scores + cập nhật bảng tổng hợp trong một transaction)
+khi đủ N ván hoặc sau T mili giây. Khi process thoát, bộ đệm được ghi nốt
+(atexit); nếu database không ghi được thì các ván được ghi ra file spool
+(JSON lines) và nạp lại ở lần khởi động sau.
+
+SCORE_INGEST=sync ghi ngay trong request như trước (dùng cho test / debug).
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from rank_index import observe_scores
+from scoring import claim_records, record_score, record_scores
+
+MODES = ("async", "sync")
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+class ScoreIngestQueue:
+    """Bộ đệm write-behind: danh sách ván chờ ghi, flush theo lô."""
+
+    def __init__(self, engine, batch_size=100, interval=0.2, spool_path=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.interval = interval
+        self.spool_path = spool_path
+        self.submitted = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.spooled = 0
+        self._pending = []
+        self._claimed_spool = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._load_spool()
+        self._thread = threading.Thread(target=self._run, name="score-ingest", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, score, max_tile, moves, seed=None):
+        """Đưa một ván vào hàng đợi (không chạm DB); seed được nhận lúc ghi lô."""
+        record = {
+            "user_id": user_id, "score": score, "max_tile": max_tile, "moves": moves,
+            "created_at": datetime.now(), "seed": seed,
+        }
+        with self._lock:
+            self.submitted += 1
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def flush(self):
+        """Ghi toàn bộ ván đang chờ trong một transaction. Trả về số ván đã ghi."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            claimed, self._claimed_spool = self._claimed_spool, None
+        if not batch:
+            return 0
+
+        try:
+            with Session(self.engine) as session, session.begin():
+                recorded = claim_records(session, batch)
+                if recorded:
+                    record_scores(session, recorded)
+        except Exception:
+            # Ghi lỗi: trả lại hàng đợi (giữ thứ tự) để thử lại
+            with self._lock:
+                self._pending[:0] = batch
+                self._claimed_spool = self._claimed_spool or claimed
+            raise
+
+        if claimed:
+            os.unlink(claimed)
+        observe_scores(recorded)
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(recorded)
+        return len(recorded)
+
+    def _run(self):
+        """Thread nền: ghi sau mỗi T giây hoặc khi đủ một lô."""
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f">>> Score ingest flush error: {e}")
+                time.sleep(1.0)
+
+    def _spool(self, records):
+        """Ghi các ván chưa lưu được ra file spool (nối thêm)."""
+        with open(self.spool_path, "a") as f:
+            for record in records:
+                f.write(json.dumps({**record, "created_at": record["created_at"].isoformat()}) + "\n")
+        self.spooled += len(records)
+
+    def _load_spool(self):
+        """Nhận file spool của lần chạy trước (đổi tên trước để chỉ một worker nhận)."""
+        if not self.spool_path:
+            return
+        claimed = f"{self.spool_path}.{os.getpid()}"
+        try:
+            os.replace(self.spool_path, claimed)
+        except FileNotFoundError:
+            return
+        with open(claimed) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    record["created_at"] = datetime.fromisoformat(record["created_at"])
+                    self._pending.append(record)
+        # File được xoá sau khi các ván này ghi thành công
+        self._claimed_spool = claimed
+        self._wake.set()
+        print(f">>> Score ingest: nạp {len(self._pending)} ván từ spool")
+
+    def close(self):
+        """Dừng thread nền và ghi nốt hàng đợi; lỗi thì ghi ra file spool."""
+        self._stopped = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f">>> Score ingest flush error: {e}")
+            with self._lock:
+                pending, self._pending = self._pending, []
+                claimed, self._claimed_spool = self._claimed_spool, None
+            if pending and self.spool_path:
+                self._spool(pending)
+                print(f">>> Score ingest: ghi {len(pending)} ván ra {self.spool_path}")
+                if claimed:
+                    # Các ván nạp từ spool cũ đã nằm trong file spool mới
+                    os.unlink(claimed)
+
+    def stats(self):
+        """Bộ đếm: số ván nhận so với số lô / số dòng thực sự ghi xuống DB."""
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "spooled": self.spooled,
+        }
+
+
+def get_ingest_queue(config):
+    """ScoreIngestQueue dùng chung trong process (tạo trong app context)."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from config import db
+
+                _queue = ScoreIngestQueue(
+                    db.engine, config["SCORE_INGEST_BATCH_SIZE"],
+                    config["SCORE_INGEST_INTERVAL_MS"] / 1000, config["SCORE_INGEST_SPOOL"]
+                )
+    return _queue
+
+
+def ingest_score(config, user_id, score, max_tile, moves, seed=None):
+    """
+    Ghi một ván đã kết thúc theo SCORE_INGEST: qua hàng đợi (async) hoặc ngay (sync).
+    Có `seed` thì ván chỉ được ghi nếu nhận được seed (cùng transaction với lần ghi).
+    """
+    mode = config["SCORE_INGEST"]
+    if mode not in MODES:
+        raise ValueError(f"SCORE_INGEST không hợp lệ: {mode}")
+    if mode == "sync":
+        if record_score(user_id, score, max_tile, moves, seed=seed) is not None:
+            observe_scores([{"user_id": user_id, "score": score}])
+    else:
+        get_ingest_queue(config).submit(user_id, score, max_tile, moves, seed)
@@ -0,0 +1,310 @@
+"""
+Ghi điểm và duy trì các bảng tổng hợp: user_best (mọi thời điểm) và
+user_best_period (theo ngày / tuần) cho leaderboard, user_stats cho trang
+lịch sử.
+
+Thứ tự xếp hạng: score giảm dần, max_tile giảm dần, moves tăng dần, ván
+đạt trước đứng trước - giống leaderboard cũ tính bằng GROUP BY trên scores.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, delete, desc, func, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from config import db
+from models import IssuedGame, Score, User, UserBest, UserBestPeriod, UserStats
+
+WINDOWS = ("day", "week", "all")
+
+
+def _beats(table, score, max_tile, moves):
+    """Điều kiện SQL: ván mới (score, max_tile, moves) xếp trên dòng hiện tại."""
+    return or_(
+        table.score < score,
+        and_(table.score == score, or_(
+            table.max_tile < max_tile,
+            and_(table.max_tile == max_tile, table.moves > moves)
+        ))
+    )
+
+
+def bucket_start(period, when):
+    """Ngày bắt đầu bucket chứa `when`: chính ngày đó, hoặc thứ Hai của tuần."""
+    day = when.date()
+    return day - timedelta(days=day.weekday()) if period == "week" else day
+
+
+def _update_best(session, model, key, values):
+    """
+    Cập nhật dòng điểm cao nhất `key` của `model` nếu ván mới tốt hơn
+    (UPDATE có điều kiện, không đọc trước); chèn nếu chưa có dòng.
+    """
+    where = [getattr(model, column) == value for column, value in key.items()]
+    statement = (
+        update(model)
+        .where(*where, _beats(model, values["score"], values["max_tile"], values["moves"]))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    result = session.execute(statement)
+    if result.rowcount or session.get(model, tuple(key.values())) is not None:
+        return
+
+    try:
+        with session.begin_nested():
+            session.execute(insert(model).values(**key, **values))
+    except IntegrityError:
+        # Request khác vừa chèn dòng này - thử UPDATE lại
+        session.execute(statement)
+
+
+def _update_stats(session, user_id, games, total_score, total_moves, best_score, best_tile, now):
+    """Cộng dồn user_stats bằng một UPDATE nguyên tử; chèn nếu user chưa có dòng."""
+    statement = (
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(
+            total_games=UserStats.total_games + games,
+            total_score=UserStats.total_score + total_score,
+            total_moves=UserStats.total_moves + total_moves,
+            best_score=case((UserStats.best_score < best_score, best_score), else_=UserStats.best_score),
+            best_tile=case((UserStats.best_tile < best_tile, best_tile), else_=UserStats.best_tile),
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if session.execute(statement).rowcount:
+        return
+
+    try:
+        with session.begin_nested():
+            session.execute(insert(UserStats).values(
+                user_id=user_id, total_games=games, total_score=total_score, total_moves=total_moves,
+                best_score=best_score, best_tile=best_tile, updated_at=now,
+            ))
+    except IntegrityError:
+        session.execute(statement)
+
+
+def _rank(entry):
+    """Khoá sắp xếp theo thứ tự xếp hạng (nhỏ hơn = xếp trên)."""
+    return -entry["score"], -entry["max_tile"], entry["moves"], entry["created_at"], entry["score_id"]
+
+
+def claim_records(session, records):
+    """
+    Các ván được ghi trong `records`: ván có "seed" phải nhận được seed đó
+    (DELETE có điều kiện trong cùng transaction với lần ghi, xem claim_game);
+    ván đã được ghi hoặc seed không phát cho user bị bỏ qua. Không commit.
+    """
+    claimed = []
+    for record in records:
+        seed = record.get("seed")
+        if seed is None or session.execute(
+            delete(IssuedGame).where(IssuedGame.seed == seed, IssuedGame.user_id == record["user_id"])
+        ).rowcount == 1:
+            claimed.append(record)
+    return claimed
+
+
+def record_scores(session, records):
+    """
+    Chèn nhiều ván (dict user_id, score, max_tile, moves, created_at) và cập
+    nhật user_best, user_best_period, user_stats - gộp theo khoá trước nên mỗi
+    user chỉ tốn một UPDATE cho mỗi bảng. Không commit. Trả về danh sách id.
+    """
+    table = Score.__table__
+    rows = [
+        {column: record[column] for column in ("user_id", "score", "max_tile", "moves", "created_at")}
+        for record in records
+    ]
+    if len(rows) > 1 and session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        ids = session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+    else:
+        ids = [session.execute(insert(table).values(**row)).inserted_primary_key[0] for row in rows]
+
+    best = {}
+    totals = {}
+    for row, score_id in zip(rows, ids):
+        entry = {**row, "score_id": score_id}
+        user_id = entry["user_id"]
+        keys = [(UserBest, (("user_id", user_id),))]
+        for period in ("day", "week"):
+            keys.append((UserBestPeriod, (
+                ("period", period),
+                ("bucket_start", bucket_start(period, entry["created_at"])),
+                ("user_id", user_id),
+            )))
+        for key in keys:
+            if key not in best or _rank(entry) < _rank(best[key]):
+                best[key] = entry
+
+        games, total_score, total_moves, best_score, best_tile = totals.get(user_id, (0, 0, 0, 0, 0))
+        totals[user_id] = (
+            games + 1, total_score + entry["score"], total_moves + entry["moves"],
+            max(best_score, entry["score"]), max(best_tile, entry["max_tile"]),
+        )
+
+    for (model, key), entry in best.items():
+        values = {column: entry[column] for column in ("score_id", "score", "max_tile", "moves", "created_at")}
+        _update_best(session, model, dict(key), values)
+    now = datetime.now()
+    for user_id, user_totals in totals.items():
+        _update_stats(session, user_id, *user_totals, now)
+    return ids
+
+
+def record_score(user_id, score, max_tile, moves, created_at=None, seed=None):
+    """
+    Lưu một ván và cập nhật các bảng tổng hợp trong cùng transaction (kể cả
+    nhận `seed` nếu có). Trả về id của Score, None nếu seed đã được ghi.
+    """
+    record = {
+        "user_id": user_id, "score": score, "max_tile": max_tile, "moves": moves,
+        "created_at": created_at or datetime.now(), "seed": seed,
+    }
+    records = claim_records(db.session, [record])
+    score_id = record_scores(db.session, records)[0] if records else None
+    db.session.commit()
+    return score_id
+
+
+def issue_game(user_id, seed):
+    """Ghi nhận seed của ván mới phát cho user (điều kiện để ghi điểm ván đó)."""
+    db.session.add(IssuedGame(seed=seed, user_id=user_id, issued_at=datetime.now()))
+    db.session.commit()
+
+
+def claim_game(user_id, seed):
+    """
+    Nhận seed để ghi điểm: True nếu seed đã phát cho chính user này và chưa
+    được ghi. Xoá dòng bằng một DELETE nên hai request đồng thời chỉ một bên thắng.
+    """
+    result = db.session.execute(
+        delete(IssuedGame).where(IssuedGame.seed == seed, IssuedGame.user_id == user_id)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def purge_issued_games(max_age):
+    """Xoá seed của các ván bỏ dở quá `max_age` giây. Trả về số dòng đã xoá."""
+    cutoff = datetime.now() - timedelta(seconds=max_age)
+    deleted = db.session.execute(delete(IssuedGame).where(IssuedGame.issued_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
+
+
+def recompute_user_stats(batch_size=1000):
+    """Tính lại user_stats từ toàn bộ scores (backfill hoặc sửa lệch). Trả về số user."""
+    db.session.query(UserStats).delete()
+    rows = (
+        db.session.query(
+            Score.user_id, func.count(Score.id), func.sum(Score.score), func.sum(Score.moves),
+            func.max(Score.score), func.max(Score.max_tile)
+        )
+        .group_by(Score.user_id)
+        .all()
+    )
+    now = datetime.now()
+    values = [
+        {
+            "user_id": user_id, "total_games": games, "total_score": int(total_score or 0),
+            "total_moves": int(total_moves or 0), "best_score": best_score or 0,
+            "best_tile": best_tile or 0, "updated_at": now,
+        }
+        for user_id, games, total_score, total_moves, best_score, best_tile in rows
+    ]
+    for start in range(0, len(values), batch_size):
+        db.session.execute(insert(UserStats), values[start:start + batch_size])
+    db.session.commit()
+    return len(values)
+
+
+def top_scores(window="all", limit=20, now=None):
+    """Top `limit` (bảng điểm cao nhất, username) của cửa sổ day / week / all."""
+    if window == "all":
+        model = UserBest
+        query = db.session.query(UserBest, User.username)
+    else:
+        model = UserBestPeriod
+        query = db.session.query(UserBestPeriod, User.username).filter(
+            UserBestPeriod.period == window,
+            UserBestPeriod.bucket_start == bucket_start(window, now or datetime.now())
+        )
+    return (
+        query.join(User, User.id == model.user_id)
+        .order_by(desc(model.score), desc(model.max_tile), model.moves.asc(), model.created_at.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+def compact_periods(keep_days=7, keep_weeks=8, now=None):
+    """Xoá bucket ngày/tuần cũ hơn thời hạn giữ lại. Trả về số dòng đã xoá."""
+    now = now or datetime.now()
+    deleted = 0
+    for period, keep in (("day", timedelta(days=keep_days)), ("week", timedelta(weeks=keep_weeks))):
+        cutoff = bucket_start(period, now - keep)
+        deleted += db.session.execute(
+            delete(UserBestPeriod).where(UserBestPeriod.period == period, UserBestPeriod.bucket_start < cutoff)
+        ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def backfill_user_best(batch_size=1000, keep_days=7, keep_weeks=8):
+    """
+    Dựng lại user_best và các bucket ngày/tuần còn trong thời hạn từ toàn bộ
+    scores (chạy một lần sau khi thêm bảng). Trả về số dòng đã ghi.
+    """
+    now = datetime.now()
+    cutoffs = {
+        "day": bucket_start("day", now - timedelta(days=keep_days)),
+        "week": bucket_start("week", now - timedelta(weeks=keep_weeks)),
+    }
+    db.session.query(UserBest).delete()
+    db.session.query(UserBestPeriod).delete()
+    rows = (
+        db.session.query(Score.id, Score.user_id, Score.score, Score.max_tile, Score.moves, Score.created_at)
+        .order_by(Score.user_id, desc(Score.score), desc(Score.max_tile), Score.moves.asc(),
+                  Score.created_at.asc(), Score.id.asc())
+        .yield_per(batch_size)
+    )
+
+    # Theo thứ tự xếp hạng: dòng đầu tiên của mỗi khoá là dòng tốt nhất
+    batches = {UserBest: [], UserBestPeriod: []}
+    seen = set()
+    count = 0
+    for row in rows:
+        created_at = row.created_at or now
+        values = {
+            "user_id": row.user_id, "score_id": row.id, "score": row.score,
+            "max_tile": row.max_tile, "moves": row.moves, "created_at": created_at,
+        }
+        keys = [(UserBest, (row.user_id,), {})]
+        for period, cutoff in cutoffs.items():
+            start = bucket_start(period, created_at)
+            if start >= cutoff:
+                keys.append((UserBestPeriod, (period, start, row.user_id), {"period": period, "bucket_start": start}))
+
+        for model, key, extra in keys:
+            if (model, key) in seen:
+                continue
+            seen.add((model, key))
+            batch = batches[model]
+            batch.append({**values, **extra})
+            if len(batch) >= batch_size:
+                db.session.execute(insert(model), batch)
+                count += len(batch)
+                batch.clear()
+
+    for model, batch in batches.items():
+        if batch:
+            db.session.execute(insert(model), batch)
+            count += len(batch)
+    db.session.commit()
+    return count
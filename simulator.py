@@ -0,0 +1,193 @@
+"""
+Headless self-play simulator - đo thông lượng engine và thống kê lối chơi.
+
+Chơi nhiều ván 2048 trên bitboard với một policy (random, greedy, hint),
+chia cho process pool, ghi kết quả từng ván ra NDJSON/CSV và in thống kê
+tổng hợp: games/sec, moves/sec, phân bố ô lớn nhất.
+"""
+
+import csv
+import json
+import random
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from bitboard import DIRECTIONS, add_random_tile, max_tile, move_and_score
+
+POLICIES = ("random", "greedy", "hint")
+RESULT_FIELDS = ("seed", "score", "max_tile", "moves")
+
+# Cấu hình policy "hint" trong process con (đặt bởi _init_worker)
+_hint_options = {"depth": 2, "node_budget": 5000}
+_hint_table = None
+
+
+def _legal_moves(board):
+    """Danh sách (hướng, bàn cờ mới, điểm cộng) cho các hướng làm thay đổi bàn cờ."""
+    moves = []
+    for direction in DIRECTIONS:
+        new_board, gained = move_and_score(board, direction)
+        if new_board != board:
+            moves.append((direction, new_board, gained))
+    return moves
+
+
+def _choose_random(board, moves, rng):
+    """Policy random: chọn ngẫu nhiên một nước hợp lệ."""
+    return rng.choice(moves)
+
+
+def _choose_greedy(board, moves, rng):
+    """Policy greedy: chọn nước được nhiều điểm nhất ngay lập tức."""
+    return max(moves, key=lambda move: move[2])
+
+
+def _choose_hint(board, moves, rng):
+    """Policy hint: dùng expectimax solver."""
+    from hint_solver import ExpectimaxSolver
+
+    result = ExpectimaxSolver(_hint_options["depth"], _hint_options["node_budget"], _hint_table).search(board)
+    for move in moves:
+        if move[0] == result["direction"]:
+            return move
+    return moves[0]
+
+
+CHOOSERS = {
+    "random": _choose_random,
+    "greedy": _choose_greedy,
+    "hint": _choose_hint,
+}
+
+
+def play_game(policy, seed, max_moves=100000):
+    """Chơi một ván từ seed cho tới khi hết nước đi. Trả về dict kết quả."""
+    choose = CHOOSERS[policy]
+    rng = random.Random(seed)
+    board, _ = add_random_tile(0, rng)
+    board, _ = add_random_tile(board, rng)
+    score = 0
+    moves = 0
+    while moves < max_moves:
+        try:
+            legal = _legal_moves(board)
+        except OverflowError:
+            break
+        if not legal:
+            break
+        _, board, gained = choose(board, legal, rng)
+        board, _ = add_random_tile(board, rng)
+        score += gained
+        moves += 1
+    return {"seed": seed, "score": score, "max_tile": max_tile(board), "moves": moves}
+
+
+def _init_worker(hint_depth, hint_node_budget):
+    """Khởi tạo process con: cấu hình policy hint và transposition table riêng."""
+    global _hint_table
+    from hint_solver import TranspositionTable
+
+    _hint_options["depth"] = hint_depth
+    _hint_options["node_budget"] = hint_node_budget
+    _hint_table = TranspositionTable()
+
+
+def _play_chunk(args):
+    """Chơi một nhóm seed liên tiếp trong process con."""
+    policy, seeds = args
+    return [play_game(policy, seed) for seed in seeds]
+
+
+class _ResultWriter:
+    """Ghi kết quả từng ván ra NDJSON hoặc CSV (stream, không giữ trong bộ nhớ)."""
+
+    def __init__(self, path, fmt):
+        self.file = open(path, "w", newline="") if path else None
+        self.fmt = fmt
+        self.csv = None
+        if self.file and fmt == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, result):
+        """Ghi kết quả một ván."""
+        if not self.file:
+            return
+        if self.csv:
+            self.csv.writerow(result)
+        else:
+            self.file.write(json.dumps(result) + "\n")
+
+    def close(self):
+        """Đóng file kết quả."""
+        if self.file:
+            self.file.close()
+
+
+def run_simulation(games, policy="random", workers=1, seed=0, output=None, fmt=None,
+                   chunk_size=100, hint_depth=2, hint_node_budget=5000, log=sys.stderr):
+    """
+    Chơi `games` ván với seed từ `seed` tới `seed + games - 1`.
+    Trả về dict thống kê tổng hợp.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Policy không hợp lệ: {policy}")
+    if fmt is None:
+        fmt = "csv" if output and output.endswith(".csv") else "ndjson"
+
+    chunks = [
+        (policy, range(start, min(start + chunk_size, seed + games)))
+        for start in range(seed, seed + games, chunk_size)
+    ]
+    writer = _ResultWriter(output, fmt)
+    tiles = Counter()
+    total_moves = 0
+    total_score = 0
+    best_score = 0
+    played = 0
+
+    started = time.perf_counter()
+    try:
+        if workers > 1:
+            pool = Pool(workers, initializer=_init_worker, initargs=(hint_depth, hint_node_budget))
+            batches = pool.imap_unordered(_play_chunk, chunks)
+        else:
+            pool = None
+            _init_worker(hint_depth, hint_node_budget)
+            batches = map(_play_chunk, chunks)
+
+        for batch in batches:
+            for result in batch:
+                writer.write(result)
+                tiles[result["max_tile"]] += 1
+                total_moves += result["moves"]
+                total_score += result["score"]
+                best_score = max(best_score, result["score"])
+                played += 1
+            if log:
+                print(f"\r{played}/{games} games", end="", file=log, flush=True)
+        if pool:
+            pool.close()
+            pool.join()
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    if log:
+        print(file=log)
+
+    return {
+        "policy": policy,
+        "games": played,
+        "workers": workers,
+        "elapsed_sec": round(elapsed, 3),
+        "games_per_sec": round(played / elapsed, 1) if elapsed else 0.0,
+        "moves_per_sec": round(total_moves / elapsed, 1) if elapsed else 0.0,
+        "avg_score": round(total_score / played, 1) if played else 0.0,
+        "best_score": best_score,
+        "avg_moves": round(total_moves / played, 1) if played else 0.0,
+        "max_tile_distribution": {
+            str(tile): round(count / played, 4) for tile, count in sorted(tiles.items())
+        },
+    }
@@ -268,15 +268,66 @@ async function startGame() {
   }
 }
 
-async function handleMove(direction) {
-  if (inputLocked) return;
+// Phím bấm trong lúc request đang chạy được gom lại và gửi một lần qua /api/moves
+const MOVE_BATCH_MAX = 16;
+let moveQueue = [];
+let moveInFlight = false;
+
+function handleMove(direction) {
+  if (inputLocked && !moveInFlight) return;
+  if (moveQueue.length < MOVE_BATCH_MAX) moveQueue.push(direction);
+  if (!moveInFlight) flushMoves();
+}
+
+// Áp dụng response rút gọn (compact) lên bàn cờ hiện tại rồi render
+function applyCompactMove(data) {
+  const grid = window.currentGrid.map(row => row.slice());
+  const size = grid.length;
+  const toCell = i => ({ r: Math.floor(i / size), c: i % size });
+  for (let i = 0; i < data.d.length; i += 2) {
+    const cell = toCell(data.d[i]);
+    grid[cell.r][cell.c] = data.d[i + 1];
+  }
+  render({
+    grid,
+    score: data.s,
+    moves: data.m,
+    new_tiles: data.n.map(toCell),
+    merged_cells: data.x.map(toCell)
+  });
+}
+
+// Response /api/moves: d/n/x/g là mảng theo từng nước đi - phát lại lần lượt từng nước có thay đổi.
+// Trả về số khung hình đã lên lịch.
+function applyCompactSteps(data) {
+  const changed = [];
+  for (let i = 0; i < data.k; i++) {
+    if (data.d[i].length || data.n[i].length) changed.push(i);
+  }
+  let score = data.s - changed.reduce((sum, i) => sum + data.g[i], 0);
+  let moves = data.m - changed.length;
+  changed.forEach((i, frame) => {
+    score += data.g[i];
+    moves += 1;
+    const step = { d: data.d[i], n: data.n[i], x: data.x[i], s: score, m: moves };
+    setTimeout(() => applyCompactMove(step), frame * ANIM_MS);
+  });
+  return Math.max(changed.length, 1);
+}
+
+async function flushMoves() {
+  const directions = moveQueue.splice(0, MOVE_BATCH_MAX);
+  if (!directions.length) return;
   inputLocked = true;
+  moveInFlight = true;
+  let gameOver = false;
+  let frames = 1;
 
   try {
-    const res = await fetch("/api/move", {
+    const res = await fetch("/api/moves", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ direction })
+      body: JSON.stringify({ directions, compact: true })
     });
     const data = await res.json();
 
@@ -286,18 +337,26 @@ async function handleMove(direction) {
       return;
     }
 
-   
-    render(data);
-    updateUndoButton(!!data.can_undo);
+    frames = applyCompactSteps(data);
+    updateUndoButton(!!data.u);
 
-    if (data.game_over) {
-      
-      setTimeout(() => showGameOverOverlay(data.game_over), ANIM_MS + 80);
+    if (data.o) {
+      gameOver = true;
+      moveQueue = [];
+      setTimeout(() => showGameOverOverlay(data.o), frames * ANIM_MS + 80);
     }
   } catch (e) {
-    console.error("handleMove fetch error:", e);
+    console.error("flushMoves fetch error:", e);
+    moveQueue = [];
   } finally {
-    setTimeout(() => (inputLocked = false), ANIM_MS);
+    setTimeout(() => {
+      moveInFlight = false;
+      if (moveQueue.length && !gameOver) {
+        flushMoves();
+      } else {
+        inputLocked = false;
+      }
+    }, frames * ANIM_MS);
   }
 }
 
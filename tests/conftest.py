@@ -0,0 +1,38 @@
+"""Fixture dùng chung: app Flask trên SQLite tạm (đã migrate) và client đã đăng nhập."""
+
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Đặt trước mọi import config (kể cả import ở đầu các file test khi collect)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from config import app as flask_app, db
+    from schema_migrations import run_migrations
+
+    # Migrate trước khi import app.py (app.py khởi động rank index ngay khi import)
+    with flask_app.app_context():
+        run_migrations(db.engine, log=None)
+    import app as _app  # noqa: F401 - đăng ký routes
+
+    flask_app.config["TESTING"] = True
+    flask_app.config["SCORE_INGEST"] = "sync"
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    """Test client đã đăng ký và đăng nhập một user mới."""
+    client = app.test_client()
+    username = "u" + uuid.uuid4().hex[:12]
+    client.post("/register", data={"username": username, "password": "secret"})
+    client.post("/login", data={"username": username, "password": "secret"})
+    return client
@@ -0,0 +1,100 @@
+"""Bitboard và batch engine phải cho cùng kết quả với Game2048 gốc."""
+
+import random
+
+import numpy as np
+import pytest
+
+from batch_engine import DIRECTIONS, batch_move
+from bitboard import BitboardGame2048, execute_move, pack_grid, unpack_board
+from game_logic import Game2048
+
+
+def _random_grid(rng):
+    return [[rng.choice((0, 0, 0, 2, 2, 4, 8, 16, 1024, 32768)) for _ in range(4)] for _ in range(4)]
+
+
+class _NoSpawnGame(Game2048):
+    """Game2048 không thêm ô mới sau mỗi nước đi."""
+
+    __slots__ = ()
+
+    def add_random_tile(self):
+        return None
+
+
+def _reference_move(grid, direction):
+    """Game2048.move() không thêm ô mới: (grid, điểm cộng, changed, merged_cells)."""
+    g = _NoSpawnGame()
+    g.grid = [row[:] for row in grid]
+    result = g.move(direction)
+    return g.grid, g.score, result["changed"], result["merged_cells"]
+
+
+def _key(cell):
+    return cell["r"], cell["c"]
+
+
+def test_execute_move_matches_game2048():
+    rng = random.Random(2048)
+    for _ in range(2000):
+        grid = _random_grid(rng)
+        for direction in DIRECTIONS:
+            expected_grid, expected_score, changed, merged = _reference_move(grid, direction)
+            board = pack_grid(grid)
+            if max(max(row) for row in expected_grid) > 32768:
+                # Gộp thành 65536 không biểu diễn được bằng 4 bit
+                with pytest.raises(OverflowError):
+                    execute_move(board, direction)
+                continue
+            new_board, gained, merged_cells = execute_move(board, direction)
+            assert unpack_board(new_board) == expected_grid
+            assert gained == expected_score
+            assert (new_board != board) == changed
+            assert sorted(merged_cells, key=_key) == sorted(merged, key=_key)
+
+
+def test_bitboard_game_matches_game2048():
+    game = BitboardGame2048()
+    game.setup(seed=7)
+    rng = random.Random(7)
+    while not game.game_over:
+        grid = [row[:] for row in game.grid]
+        score = game.score
+        direction = rng.choice(DIRECTIONS)
+        expected_grid, gained, changed, _ = _reference_move(grid, direction)
+        result = game.move(direction)
+        assert result["changed"] == changed
+        assert game.score == score + gained
+        if changed:
+            # Khác grid tham chiếu đúng một ô: ô mới (2 hoặc 4) ở vị trí trống
+            tile = result["new_tile"][0]
+            expected_grid[tile["r"]][tile["c"]] = game.grid[tile["r"]][tile["c"]]
+            assert game.grid[tile["r"]][tile["c"]] in (2, 4)
+        assert game.grid == expected_grid
+        if not game.any_moves_left():
+            game.game_over = True
+    assert game.max_tile() == max(max(row) for row in game.grid)
+
+
+@pytest.mark.parametrize("direction", DIRECTIONS)
+def test_batch_move_matches_game2048(direction):
+    rng = random.Random(hash(direction) & 0xFFFF)
+    grids = [_random_grid(rng) for _ in range(500)]
+    new_boards, scores, changed, _ = batch_move(np.array(grids), direction)
+    for i, grid in enumerate(grids):
+        expected_grid, expected_score, expected_changed, _ = _reference_move(grid, direction)
+        assert new_boards[i].tolist() == expected_grid
+        assert scores[i] == expected_score
+        assert changed[i] == expected_changed
+
+
+def test_batch_move_mixed_directions_and_game_over():
+    rng = random.Random(5)
+    grids = [_random_grid(rng) for _ in range(400)]
+    directions = [rng.choice(DIRECTIONS) for _ in grids]
+    new_boards, _, _, game_over = batch_move(np.array(grids), directions)
+    for i, grid in enumerate(grids):
+        expected_grid = _reference_move(grid, directions[i])[0]
+        assert new_boards[i].tolist() == expected_grid
+        assert game_over[i] == (not any(_reference_move(expected_grid, d)[2] for d in DIRECTIONS))
@@ -0,0 +1,54 @@
+"""encode_game/decode_game phải khôi phục đúng trạng thái ván."""
+
+import random
+
+import pytest
+
+from bitboard import BitboardGame2048
+from game_codec import decode_game, encode_game
+
+
+def _state(g):
+    return (g.grid, g.score, g.moves, g.game_over, g.last_state, list(g.history),
+            list(g.redo_stack), g.seed, g.log, list(g.redo_log))
+
+
+def _played_game(seed, moves):
+    g = BitboardGame2048()
+    g.setup(seed=seed)
+    rng = random.Random(seed)
+    for _ in range(moves):
+        g.move(rng.choice(("left", "right", "up", "down")))
+    return g
+
+
+def test_round_trip_with_history_and_redo():
+    g = _played_game(11, 60)
+    g.undo(3)
+    data = encode_game(g)
+    restored = decode_game(data)
+    assert _state(restored) == _state(g)
+
+    # Redo sau khi giải mã cho cùng kết quả với bản gốc
+    g.redo(2)
+    restored.redo(2)
+    assert _state(restored) == _state(g)
+
+
+def test_round_trip_wide_board():
+    g = _played_game(3, 10)
+    grid = [row[:] for row in g.grid]
+    grid[0][0] = 65536
+    g.grid = grid
+    assert g.board is None
+
+    restored = decode_game(encode_game(g))
+    assert restored.grid == grid
+    assert (restored.score, restored.moves, restored.seed, restored.log) == (g.score, g.moves, g.seed, g.log)
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_game(b"\x03")
+    with pytest.raises(ValueError):
+        decode_game(b"\xff\x00" + bytes(32))
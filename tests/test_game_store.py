@@ -0,0 +1,159 @@
+"""RedisGameStore trên một server RESP giả (không cần Redis thật)."""
+
+import socket
+import socketserver
+import threading
+
+import pytest
+
+import game_store
+from game_store import RedisError, RedisGameStore
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """Server RESP tối giản: AUTH, SELECT, GET, SET ... EX, DEL với đồng hồ giả cho TTL."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.password = password
+        self.data = {}
+        self.commands = []
+        self.now = 0.0
+        self.lock = threading.Lock()
+        self.sockets = []
+
+    def url(self, db=0):
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.server_address[1]}/{db}"
+
+    def advance(self, seconds):
+        """Tua đồng hồ giả."""
+        self.now += seconds
+
+    def drop_connections(self):
+        """Đóng mọi kết nối đang mở (giống server khởi động lại)."""
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.sockets.clear()
+
+    def count(self, name):
+        return sum(1 for command in self.commands if command[0] == name)
+
+    def execute(self, args, session):
+        name = args[0].upper()
+        with self.lock:
+            self.commands.append([name] + args[1:])
+            if name == b"AUTH":
+                if args[1].decode() != self.password:
+                    return b"-WRONGPASS invalid password\r\n"
+                session["authed"] = True
+                return b"+OK\r\n"
+            if not session["authed"]:
+                return b"-NOAUTH Authentication required.\r\n"
+            if name == b"SELECT":
+                return b"+OK\r\n"
+            if name == b"GET":
+                entry = self.data.get(args[1])
+                if entry is None or entry[1] <= self.now:
+                    self.data.pop(args[1], None)
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if name == b"SET":
+                ttl = int(args[4]) if len(args) > 4 and args[3].upper() == b"EX" else float("inf")
+                self.data[args[1]] = (args[2], self.now + ttl)
+                return b"+OK\r\n"
+            if name == b"DEL":
+                return b":%d\r\n" % (self.data.pop(args[1], None) is not None)
+        return b"-ERR unknown command\r\n"
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.sockets.append(self.request)
+        session = {"authed": self.server.password is None}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(self.server.execute(args, session))
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_round_trip(redis_server):
+    store = RedisGameStore(redis_server.url(), ttl=60)
+    assert store.get("g1") is None
+    data = b"\x03\x00binary\r\n\x00"
+    store.set("g1", data)
+    assert store.get("g1") == data
+    store.delete("g1")
+    assert store.get("g1") is None
+
+
+def test_ttl_expiry(redis_server):
+    store = RedisGameStore(redis_server.url(), ttl=60)
+    store.set("g1", b"state")
+    assert redis_server.commands[-1] == [b"SET", b"game:g1", b"state", b"EX", b"60"]
+    redis_server.advance(59)
+    assert store.get("g1") == b"state"
+    redis_server.advance(2)
+    assert store.get("g1") is None
+
+
+def test_auth_select_and_reconnect():
+    server = FakeRedisServer(password="pw")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        store = RedisGameStore(server.url(db=3), ttl=60)
+        store.set("g1", b"state")
+        assert server.commands[:2] == [[b"AUTH", b"pw"], [b"SELECT", b"3"]]
+
+        # Kết nối cũ bị đóng: lệnh tiếp theo tự kết nối (và xác thực) lại
+        server.drop_connections()
+        assert store.get("g1") == b"state"
+        assert server.count(b"AUTH") == 2
+
+        with pytest.raises(RedisError):
+            RedisGameStore(server.url().replace(":pw@", ":wrong@")).get("g1")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_unchanged_state_is_not_written(client, redis_server, monkeypatch):
+    monkeypatch.setattr(game_store, "_store", RedisGameStore(redis_server.url(), ttl=60))
+
+    assert client.post("/api/start_game").status_code == 200
+    assert redis_server.count(b"SET") == 1
+
+    # Chỉ đọc: game không đổi nên không ghi lại
+    state = client.get("/api/load_game").get_json()
+    assert redis_server.count(b"SET") == 1
+
+    changed = False
+    for direction in ("left", "right", "up", "down"):
+        data = client.post("/api/move", json={"direction": direction}).get_json()
+        if data["changed"]:
+            changed = True
+            break
+    assert changed
+    assert redis_server.count(b"SET") == 2
+    assert client.get("/api/load_game").get_json()["grid"] != state["grid"]
+    assert redis_server.count(b"SET") == 2
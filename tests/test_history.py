@@ -0,0 +1,76 @@
+"""Phân trang keyset của lịch sử ván: không trùng, không sót, quay lại được."""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import db
+from models import User
+from routes.history import decode_cursor, history_page
+from scoring import record_score
+
+
+@pytest.fixture
+def user_scores(app):
+    """User mới với 23 ván; nhiều ván trùng created_at để kiểm tra thứ tự theo id."""
+    with app.app_context():
+        user = User(username="h" + uuid.uuid4().hex[:12])
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.commit()
+        base = datetime(2026, 1, 1)
+        ids = [
+            record_score(user.id, 100 + i, 128, 50, created_at=base + timedelta(minutes=i // 3))
+            for i in range(23)
+        ]
+        yield user.id, ids
+
+
+def _ids(rows):
+    return [row.id for row in rows]
+
+
+def test_pages_cover_all_rows_newest_first(app, user_scores):
+    user_id, ids = user_scores
+    expected = sorted(ids, reverse=True)
+
+    seen, cursor, pages = [], None, []
+    while True:
+        rows, next_cursor, prev_cursor = history_page(user_id, after=cursor, per_page=5)
+        assert (prev_cursor is None) == (cursor is None)
+        pages.append((rows, prev_cursor))
+        seen.extend(_ids(rows))
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    assert seen == expected
+    assert [len(rows) for rows, _ in pages] == [5, 5, 5, 5, 3]
+
+    # Quay lại từ trang cuối cho đúng các trang trước đó
+    for (rows, prev_cursor), (previous_rows, _) in zip(pages[:0:-1], pages[-2::-1]):
+        back, next_cursor, _ = history_page(user_id, before=prev_cursor, per_page=5)
+        assert _ids(back) == _ids(previous_rows)
+        assert next_cursor is not None
+
+
+def test_first_page_via_before_has_no_prev(app, user_scores):
+    user_id, _ = user_scores
+    first, next_cursor, _ = history_page(user_id, per_page=5)
+    second, _, prev_cursor = history_page(user_id, after=next_cursor, per_page=5)
+    back, _, back_prev = history_page(user_id, before=prev_cursor, per_page=5)
+    assert _ids(back) == _ids(first)
+    assert back_prev is None
+
+
+def test_invalid_cursor(app, user_scores):
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_api_history_cursors(client):
+    response = client.get("/api/history?after=%%%")
+    assert response.status_code == 400
+    response = client.get("/api/history?limit=5")
+    body = response.get_json()
+    assert body["ok"] and body["items"] == [] and body["next_cursor"] is None
@@ -0,0 +1,51 @@
+"""verify_score chấp nhận ván thật và từ chối điểm/log bị sửa."""
+
+import random
+
+from bitboard import BitboardGame2048
+from replay import replay_game, verify_score
+
+
+def _finished_game(seed):
+    g = BitboardGame2048()
+    g.setup(seed=seed)
+    rng = random.Random(seed)
+    while g.any_moves_left():
+        g.move(rng.choice(("left", "right", "up", "down")))
+    return g
+
+
+def test_replay_matches_played_game():
+    g = _finished_game(42)
+    result = replay_game(g.seed, g.log)
+    assert result == {"score": g.score, "max_tile": g.max_tile(), "moves": g.moves, "game_over": True}
+
+
+def test_verify_score_accepts_real_game():
+    g = _finished_game(43)
+    assert verify_score(g.seed, g.log, g.score, g.max_tile(), g.moves) == (True, None)
+
+
+def test_verify_score_rejects_tampering():
+    g = _finished_game(44)
+    ok, reason = verify_score(g.seed, g.log, g.score + 4, g.max_tile(), g.moves)
+    assert not ok and "score" in reason
+    ok, _ = verify_score(g.seed, g.log, g.score, g.max_tile() * 2, g.moves)
+    assert not ok
+    ok, _ = verify_score(g.seed + 1, g.log, g.score, g.max_tile(), g.moves)
+    assert not ok
+    # Log bị cắt: ván chưa kết thúc
+    ok, _ = verify_score(g.seed, g.log[:-5], g.score, g.max_tile(), g.moves)
+    assert not ok
+    # Nước đi không làm thay đổi bàn cờ là log không hợp lệ
+    ok, _ = verify_score(g.seed, g.log + g.log[-1], g.score, g.max_tile(), g.moves)
+    assert not ok
+
+
+def test_verify_score_unfinished_game():
+    g = _finished_game(45)
+    log = g.log[:20]
+    result = replay_game(g.seed, log)
+    assert not verify_score(g.seed, log, result["score"], result["max_tile"], result["moves"])[0]
+    assert verify_score(g.seed, log, result["score"], result["max_tile"], result["moves"],
+                        require_game_over=False) == (True, None)